@@ -0,0 +1,72 @@
+from collections import namedtuple
+
+from models import db, ParkingLot, ParkingSpot
+
+# How often to retry when another transaction grabs the spot we picked.
+# SQLite serialises writers so the first attempt always wins there.
+MAX_CLAIM_ATTEMPTS = 5
+
+# The lot's counters as written by the same UPDATE, so callers can report
+# occupancy without reading the lot again.
+Occupancy = namedtuple('Occupancy', 'lot_id occupied available')
+Claim = namedtuple('Claim', 'spot_id occupancy')
+
+
+def claim_spot(lot_id):
+    """Atomically claim a free spot in a lot.
+
+    Returns a Claim with the spot id and the lot's new occupancy, or None
+    when the lot is full. The caller owns the transaction and must commit
+    (or roll back) afterwards.
+    """
+    # Reserve capacity first. This is a primary-key update guarded by the
+    # stored counter, so a full lot is rejected without touching its spots.
+    counters = db.session.execute(
+        db.update(ParkingLot)
+        .where(ParkingLot.id == lot_id, ParkingLot.available > 0)
+        .values(occupied=ParkingLot.occupied + 1, available=ParkingLot.available - 1)
+        .returning(ParkingLot.occupied, ParkingLot.available)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if counters is None:
+        return None
+
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        candidate = (
+            db.select(ParkingSpot.id)
+            .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A')
+            .limit(1)
+            .scalar_subquery()
+        )
+        spot_id = db.session.execute(
+            db.update(ParkingSpot)
+            .where(ParkingSpot.id == candidate, ParkingSpot.status == 'A')
+            .values(status='O')
+            .returning(ParkingSpot.id)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        if spot_id is not None:
+            return Claim(spot_id, Occupancy(lot_id, *counters))
+
+    # The counter said there was room but no spot could be claimed, so the
+    # counters have drifted. Give the capacity back and report the lot full.
+    ParkingLot.adjust_counters(lot_id, -1)
+    return None
+
+
+def free_spot(spot_id):
+    """Return an occupied spot to the pool.
+
+    Returns the lot's new Occupancy, or None if the spot was already free.
+    """
+    lot_id = db.session.execute(
+        db.update(ParkingSpot)
+        .where(ParkingSpot.id == spot_id, ParkingSpot.status == 'O')
+        .values(status='A')
+        .returning(ParkingSpot.lot_id)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if lot_id is None:
+        return None
+
+    return Occupancy(lot_id, *ParkingLot.adjust_counters(lot_id, -1))
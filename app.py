@@ -1,47 +1,65 @@
-from flask import Flask, session,render_template
-from flask_bcrypt import Bcrypt
-from flask_login import LoginManager
-from models import db, User,Admin
-from flask_migrate import Migrate
-from flask_cors import CORS
-from flask_restful import Api
-
-app = Flask(__name__)
-
-
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///vechile_parking.db'
-app.config['SECRET_KEY'] = 'your_secret_key_here'
-
-api = Api(app)
-CORS(app)
-db.init_app(app)
-migrate = Migrate(app, db)
-bcrypt = Bcrypt(app)
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'
-
-@login_manager.user_loader
-def load_user(user_id):
-    user_type = session.get('user_type')
-    if user_type == 'user':
-        return User.query.get(int(user_id))
-    elif user_type == 'admin':
-        return Admin.query.get(int(user_id))
-    return None
-
-from controllers.auth import auth_bp
-from controllers.admin import admin_bp
-from controllers.user import user_bp
-from controllers.api import api_bp
-app.register_blueprint(api_bp)
-app.register_blueprint(auth_bp)
-app.register_blueprint(admin_bp)
-app.register_blueprint(user_bp)
-
-@app.route('/')
+import os
+
+from flask import Flask, render_template
+
+from models import db
+from database import database
+from cache import reference_cache
+from identity import identity_cache
+from perf import query_profiler
+from metrics import metrics
+from events import lot_events
+from jobs import job_runner
+from extensions import bcrypt, cors, login_manager
+
+
+def create_app(config=None, cli=True, **settings):
+    """Build an application.
+
+    `config` is a settings class from config.py or its import path;
+    APP_CONFIG picks one when it is omitted. Keyword arguments override
+    single settings. With cli=False the `flask` commands, and Alembic
+    with them, are left out; production.py does this for web workers.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config or os.environ.get('APP_CONFIG', 'config.Config'))
+    app.config.update(settings)
+    if not app.config.get('SECRET_KEY'):
+        raise RuntimeError("SECRET_KEY is not set.")
+
+    cors.init_app(app)
+    database.init_app(app)
+    db.init_app(app)
+    reference_cache.init_app(app)
+    identity_cache.init_app(app)
+    query_profiler.init_app(app)
+    metrics.init_app(app)
+    lot_events.init_app(app)
+    job_runner.init_app(app)
+    bcrypt.init_app(app)
+    login_manager.init_app(app)
+
+    from controllers.auth import auth_bp
+    from controllers.admin import admin_bp
+    from controllers.user import user_bp
+    from controllers.api import api_bp
+    app.register_blueprint(api_bp)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(user_bp)
+
+    app.add_url_rule('/', 'index', index)
+
+    if cli:
+        import commands
+        commands.init_app(app)
+
+    return app
+
+
 def index():
     return render_template('index.html')
 
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,90 @@
+from models import db, ParkingSpot, Reservation, ReservationArchive
+
+# Reservations moved per transaction by archive_reservations().
+ARCHIVE_BATCH_SIZE = 5000
+
+ARCHIVE_COLUMNS = ['id', 'spot_id', 'lot_id', 'user_id', 'vehicle_number',
+                   'parking_timestamp', 'leaving_timestamp', 'parking_cost']
+
+
+def archive_reservations(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move reservations that ended before `cutoff` into reservation_archive.
+
+    Works through the table in id order, one batch per transaction. Each
+    batch is copied with INSERT OR IGNORE, and then only the rows that are
+    now in the archive are deleted, so a run that stops part way loses
+    nothing and carries on where it left off when started again. A row
+    whose spot is gone has no lot to archive under and stays where it is.
+    Returns the number of reservations moved.
+    """
+    closed = db.and_(Reservation.is_active == False, Reservation.leaving_timestamp < cutoff)
+    moved = 0
+    after = 0
+    while True:
+        ids = db.session.execute(
+            db.select(Reservation.id)
+            .where(Reservation.id > after, closed)
+            .order_by(Reservation.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        batch = db.and_(Reservation.id.between(ids[0], ids[-1]), closed)
+
+        copy_to_archive(
+            db.select(*archive_row(ParkingSpot.lot_id))
+            .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+            .where(batch)
+        )
+        moved += delete_archived(batch)
+        db.session.commit()
+
+        after = ids[-1]
+    return moved
+
+
+def archive_spot_reservations(lot_id, spot_ids):
+    """Move the completed reservations of spots removed from lot `lot_id`
+    into reservation_archive. The spots may already be deleted. Returns
+    the number moved; the caller commits."""
+    removed = db.and_(
+        Reservation.spot_id.in_(spot_ids),
+        Reservation.is_active == False,
+        Reservation.leaving_timestamp.isnot(None)
+    )
+    copy_to_archive(db.select(*archive_row(db.literal(lot_id))).where(removed))
+    return delete_archived(removed)
+
+
+def archive_row(lot_id):
+    """Reservation columns in ARCHIVE_COLUMNS order, with `lot_id` as the lot."""
+    return (
+        Reservation.id, Reservation.spot_id, lot_id, Reservation.user_id,
+        Reservation.vehicle_number, Reservation.parking_timestamp,
+        Reservation.leaving_timestamp, Reservation.parking_cost
+    )
+
+
+def copy_to_archive(rows):
+    db.session.execute(
+        db.insert(ReservationArchive).from_select(ARCHIVE_COLUMNS, rows).prefix_with('OR IGNORE')
+    )
+
+
+def delete_archived(condition):
+    """Delete the reservations matching `condition` that are in the archive.
+    Returns how many were deleted."""
+    # Matched on more than the id: databases from before reservation
+    # ids were AUTOINCREMENT may have handed an archived id out again.
+    archived = (
+        db.select(ReservationArchive.id)
+        .where(
+            ReservationArchive.id == Reservation.id,
+            ReservationArchive.spot_id == Reservation.spot_id,
+            ReservationArchive.parking_timestamp == Reservation.parking_timestamp
+        )
+        .exists()
+    )
+    return db.session.execute(
+        db.delete(Reservation).where(condition, archived).execution_options(synchronize_session=False)
+    ).rowcount
@@ -0,0 +1,124 @@
+"""Archiving regression check.
+
+Reserves and releases through the app, archives everything, parks again
+and archives again, then checks that every reservation is in exactly one
+of `reservation` and `reservation_archive`, that ids were never reused,
+that a reservation whose spot is gone is left in place rather than
+deleted, and that shrinking a lot archives the history of the spots it
+removes. Exits non-zero if any check fails.
+
+    python benchmarks/archive_integrity.py
+"""
+import os
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'archive.db')}"
+
+from app import create_app  # noqa: E402
+from archive import archive_reservations  # noqa: E402
+from models import db, ParkingLot, ParkingSpot, Reservation, ReservationArchive  # noqa: E402
+from provisioning import resize_lot  # noqa: E402
+import seed  # noqa: E402
+
+app = create_app(JOBS_IN_PROCESS=False)
+
+
+def park(client, *vehicle_numbers, lot_id=1):
+    """Reserve a spot in the lot for each vehicle, then release them all.
+    Returns the last reservation id."""
+    for vehicle_number in vehicle_numbers:
+        client.post(f'/user/reserve/{lot_id}', data={'vehicle_number': vehicle_number})
+    with app.app_context():
+        reservation_ids = (
+            db.session.query(Reservation.id)
+            .filter(Reservation.vehicle_number.in_(vehicle_numbers), Reservation.is_active == True)
+            .order_by(Reservation.id)
+            .all()
+        )
+    for (reservation_id,) in reservation_ids:
+        client.post(f'/user/release/{reservation_id}')
+    return reservation_ids[-1][0]
+
+
+def archive_all():
+    with app.app_context():
+        return archive_reservations(datetime.utcnow() + timedelta(days=1))
+
+
+def stored():
+    """(id, vehicle number) of every reservation, live and archived."""
+    with app.app_context():
+        return (
+            db.session.query(Reservation.id, Reservation.vehicle_number).all()
+            + db.session.query(ReservationArchive.id, ReservationArchive.vehicle_number).all()
+        )
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        seed.seed_admin()
+        seed.seed_cities()
+        seed.seed_users()
+        seed.seed_parking_lots_and_spots()
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'johndoe', 'password': 'password123'})
+
+    errors = []
+    first = [park(client, 'KA01AA0001'), park(client, 'KA01AA0002')]
+    if archive_all() != len(first):
+        errors.append("first run did not archive every completed reservation")
+
+    later = park(client, 'KA01AA0003')
+    if later <= max(first):
+        errors.append(f"reservation id {later} reused after archiving ids up to {max(first)}")
+    archive_all()
+
+    # A completed reservation whose spot was deleted has no lot to archive under.
+    orphan = park(client, 'KA01AA0004')
+    with app.app_context():
+        spot_id = db.session.get(Reservation, orphan).spot_id
+        db.session.execute(db.delete(ParkingSpot).where(ParkingSpot.id == spot_id))
+        db.session.commit()
+    archive_all()
+
+    # Two spots used at once, then the lot shrunk to one: the newer spot goes.
+    removed = park(client, 'KA01AA0005', 'KA01AA0006', lot_id=2)
+    with app.app_context():
+        lot = db.session.get(ParkingLot, 2)
+        resize_lot(lot, 1)
+        db.session.commit()
+        kept_in_archive = db.session.get(ReservationArchive, removed)
+        if kept_in_archive is None or kept_in_archive.lot_id != 2:
+            errors.append("shrinking a lot did not archive the removed spot's reservations")
+
+    rows = stored()
+    ids = Counter(reservation_id for reservation_id, _ in rows)
+    vehicles = Counter(vehicle for _, vehicle in rows)
+    for vehicle in ('KA01AA0001', 'KA01AA0002', 'KA01AA0003', 'KA01AA0004', 'KA01AA0005', 'KA01AA0006'):
+        if vehicles[vehicle] != 1:
+            errors.append(f"{vehicle} is stored {vehicles[vehicle]} time(s)")
+    for reservation_id, count in ids.items():
+        if count > 1:
+            errors.append(f"reservation id {reservation_id} is stored {count} times")
+    with app.app_context():
+        if db.session.get(Reservation, orphan) is None:
+            errors.append("a reservation whose spot is gone was deleted without being archived")
+
+    print(f"{len(rows)} reservation(s) after three archive runs and a lot shrink.")
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Archiving kept every reservation exactly once.")
+
+
+if __name__ == '__main__':
+    main()
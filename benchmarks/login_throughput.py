@@ -0,0 +1,157 @@
+"""Login throughput benchmark.
+
+Hammers POST /login from several threads with valid logins, wrong
+passwords and unknown usernames, and reports attempts per second and
+p50/p95 latency for each. Fails if any attempt ran other than exactly one
+bcrypt check, or if an account hashed at a different work factor is not
+rehashed on its first successful login.
+
+    python benchmarks/login_throughput.py --rounds 12 --threads 8 --attempts 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=12, help="BCRYPT_LOG_ROUNDS for the app")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--attempts', type=int, default=200, help="login attempts per scenario")
+    parser.add_argument('--users', type=int, default=100)
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'login.db')}"
+os.environ['BCRYPT_LOG_ROUNDS'] = str(ARGS.rounds)
+
+from app import create_app  # noqa: E402
+from controllers import auth  # noqa: E402
+from models import db, User  # noqa: E402
+
+app = create_app()
+
+PASSWORD = 'password123'
+LEGACY_USERNAME = 'legacy'
+
+
+def setup(users):
+    with app.app_context():
+        db.create_all()
+        password_hash = auth.bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+        db.session.execute(db.insert(User), [
+            {'username': f'login{i:05d}', 'full_name': f'Login {i}', 'email': f'login{i:05d}@example.com',
+             'password_hash': password_hash, 'role': 'user'}
+            for i in range(users)
+        ])
+        # An account hashed at a different cost, as left behind by an
+        # earlier BCRYPT_LOG_ROUNDS setting.
+        legacy_rounds = ARGS.rounds + 1 if ARGS.rounds < 14 else ARGS.rounds - 1
+        db.session.add(User(
+            username=LEGACY_USERNAME, full_name='Legacy', email='legacy@example.com', role='user',
+            password_hash=auth.bcrypt.generate_password_hash(PASSWORD, rounds=legacy_rounds).decode('utf-8')
+        ))
+        db.session.commit()
+
+
+class BcryptCounter:
+    """Wraps check_password_hash to count calls from all threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.original = auth.bcrypt.check_password_hash
+        auth.bcrypt.check_password_hash = self
+
+    def __call__(self, password_hash, password):
+        with self.lock:
+            self.calls += 1
+        return self.original(password_hash, password)
+
+    def reset(self):
+        with self.lock:
+            calls, self.calls = self.calls, 0
+        return calls
+
+
+def attempt_logins(credentials, threads):
+    """Run every (username, password) pair once; returns (latencies, successes)."""
+    latencies = []
+    successes = []
+    lock = threading.Lock()
+    queue = list(credentials)
+
+    def work():
+        client = app.test_client()
+        while True:
+            with lock:
+                if not queue:
+                    return
+                username, password = queue.pop()
+            started = time.perf_counter()
+            response = client.post('/login', data={'username': username, 'password': password})
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                successes.append(response.status_code == 302)
+            client.get('/logout')
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies, successes
+
+
+def main():
+    setup(ARGS.users)
+    counter = BcryptCounter()
+    errors = []
+
+    # Rehash: the legacy account's cost must match the app's after one login.
+    attempt_logins([(LEGACY_USERNAME, PASSWORD)], 1)
+    with app.app_context():
+        stored = User.query.filter_by(username=LEGACY_USERNAME).one().password_hash
+    if auth.hash_rounds(stored) != ARGS.rounds:
+        errors.append(f"legacy hash was not rehashed (cost {auth.hash_rounds(stored)})")
+    counter.reset()
+
+    scenarios = {
+        'valid': (lambda i: (f'login{i % ARGS.users:05d}', PASSWORD), True),
+        'wrong password': (lambda i: (f'login{i % ARGS.users:05d}', 'wrong'), False),
+        'unknown user': (lambda i: (f'nobody{i:05d}', PASSWORD), False),
+    }
+
+    print(f"\nBCRYPT_LOG_ROUNDS={ARGS.rounds}, {ARGS.threads} threads, {ARGS.attempts} attempts each")
+    print(f"{'scenario':16} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, (credential, should_succeed) in scenarios.items():
+        started = time.perf_counter()
+        latencies, successes = attempt_logins([credential(i) for i in range(ARGS.attempts)], ARGS.threads)
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        print(f"{name:16} {ARGS.attempts / elapsed:9.1f} "
+              f"{latencies[len(latencies) // 2] * 1000:8.1f} "
+              f"{latencies[int(len(latencies) * 0.95)] * 1000:8.1f}")
+
+        calls = counter.reset()
+        if calls != ARGS.attempts:
+            errors.append(f"{name}: {calls} bcrypt checks for {ARGS.attempts} attempts")
+        if any(success != should_succeed for success in successes):
+            errors.append(f"{name}: unexpected login result")
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("\n✅ One bcrypt check per attempt; stale hashes are rehashed on login.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Query-plan regression check for the controllers.
+
+Drives every blueprint route through the Flask test client against a
+throwaway SQLite database, records each SQL statement the views issue and
+runs EXPLAIN QUERY PLAN on it; statements from background job workers
+are checked under 'jobs'. Exits non-zero if a filtered query falls
+back to a full table scan.
+
+    python benchmarks/query_plans.py
+"""
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'plans.db')}"
+
+from flask import has_request_context, request  # noqa: E402
+from sqlalchemy import event, inspect  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, Reservation, ReservationArchive, User  # noqa: E402
+import seed  # noqa: E402
+
+app = create_app(JOBS_REPORT_DIR=os.path.join(TMP, 'reports'))
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+FILTERED = re.compile(r'\bWHERE\b')
+
+# Known full scans, keyed by endpoint and matched against the normalised SQL
+# text. Every entry needs a reason; shrink this list, don't grow it.
+ALLOWED_SCANS = {
+    'admin.summary': [
+        # Every row of the user table has role 'user'; this is a total.
+        'FROM user WHERE user.role = ?',
+    ],
+    'jobs': [
+        # reconcile-counters recounts every lot; the WHERE is in the subqueries.
+        'UPDATE parking_lot SET occupied=(SELECT count(parking_spot.id)',
+    ],
+}
+
+
+def capture(statements):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            return
+        if has_request_context():
+            endpoint = request.endpoint
+        elif threading.current_thread().name.startswith('jobs-'):
+            endpoint = 'jobs'  # background job workers
+        else:
+            return
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb in ('SELECT', 'UPDATE', 'DELETE'):
+            statements.setdefault((endpoint, statement), parameters)
+    return before_cursor_execute
+
+
+def exercise(client):
+    def login(username, password):
+        client.get('/logout')
+        client.post('/login', data={'username': username, 'password': password})
+
+    login('johndoe', 'password123')
+    client.get('/user/dashboard')
+    client.get('/user/dashboard?search=road&state=karnataka&city=bengaluru')
+    client.post('/user/reserve/1', data={'vehicle_number': 'KA01AB1234'})
+    with app.app_context():
+        reservation_id = Reservation.query.filter_by(is_active=True).first().id
+    client.get('/user/my-reservations')
+    client.get('/user/my-reservations/completed?cursor=2030-01-01T00:00:00_1')
+    client.get('/user/summary')
+    client.post(f'/user/release/{reservation_id}')
+    client.post('/user/reserve/1', data={'vehicle_number': 'KA01AB1234'})
+
+    client.get('/api/lots')
+    client.get('/api/lots/1/spots')
+    client.get('/api/lots/search?q=5600')
+    client.get('/api/reservations')
+    client.get('/api/reservations?user_id=2&since=2024-01-01T00:00:00&cursor=1')
+
+    login('admin', 'admin123')
+    client.get('/admin/dashboard')
+    client.get('/admin/dashboard?search=road&state=karnataka&city=bengaluru')
+    client.get('/admin/users')
+    client.get('/admin/users?search=john')
+    client.get('/admin/users?after=1')
+    client.get('/admin/summary')
+    client.get('/admin/summary?start=2024-01-01&end=2024-12-31')
+    grid = '/admin/summary/reservations'
+    next_cursor = client.get(f'{grid}?limit=1').get_json()['next_cursor']
+    client.get(f'{grid}?limit=1&cursor={next_cursor}')
+    client.get(f'{grid}?sort=id&order=asc&cursor=1&lot_id=1')
+    client.get(f'{grid}?user_id=2&vehicle=KA&start=2024-01-01&end=2030-12-31')
+    client.get(f'{grid}?vehicle=KA01')
+    client.get('/admin/export/reservations.csv?city_id=1&start=2024-01-01&end=2030-12-31')
+    client.get('/admin/export/revenue.xlsx?lot_id=1')
+    job = client.post('/admin/reports/reservations.xlsx?city_id=1&start=2024-01-01').get_json()
+    client.post('/admin/jobs', data={'kind': 'reconcile-counters'})
+    client.get('/admin/jobs')
+    while job['status'] in ('queued', 'running'):
+        time.sleep(0.05)
+        job = client.get(job['status_url']).get_json()
+    client.get(job['download_url'])
+    for thread in threading.enumerate():
+        if thread.name.startswith('jobs-'):
+            thread.join()
+    client.get('/admin/lots/1/spots')
+    client.get('/admin/edit-lot/2')
+    client.post('/admin/lots/3/delete')
+
+
+def full_scans(connection, statement, parameters):
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    scanned = [m.group(1) for m in (FULL_SCAN.match(row[-1]) for row in rows) if m]
+    # Scans of a subquery's (already filtered) rows are not table scans.
+    tables = set(inspect(connection).get_table_names())
+    return [name for name in scanned if name in tables]
+
+
+def main():
+    statements = {}
+    with app.app_context():
+        db.create_all()
+        seed.seed_admin()
+        seed.seed_cities()
+        seed.seed_users()
+        seed.seed_parking_lots_and_spots()
+        # One archived stay, so listings read reservation_archive as well.
+        db.session.add(ReservationArchive(
+            id=1000000, spot_id=1, lot_id=1, user_id=User.query.filter_by(username='johndoe').one().id,
+            vehicle_number='KA01AB1234', parking_timestamp=datetime(2024, 1, 1, 9),
+            leaving_timestamp=datetime(2024, 1, 1, 11), parking_cost=40.0
+        ))
+        db.session.commit()
+        # On the Engine class so the read-only pool is captured too.
+        event.listen(Engine, 'before_cursor_execute', capture(statements))
+
+    exercise(app.test_client())
+
+    failures = []
+    with app.app_context():
+        with db.engine.connect() as connection:
+            for (endpoint, statement), parameters in statements.items():
+                if not FILTERED.search(statement):
+                    continue  # unfiltered listings read everything by design
+                normalised = ' '.join(statement.split())
+                if any(allowed in normalised for allowed in ALLOWED_SCANS.get(endpoint, [])):
+                    continue
+                for table in full_scans(connection, statement, parameters):
+                    failures.append((endpoint, table, statement))
+
+    print(f"Checked {len(statements)} distinct statements.")
+    for endpoint, table, statement in failures:
+        print(f"❌ {endpoint}: full scan of '{table}'\n    {' '.join(statement.split())}")
+    if failures:
+        sys.exit(1)
+    print("✅ No filtered query falls back to a full table scan.")
+
+
+if __name__ == '__main__':
+    main()
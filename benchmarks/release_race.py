@@ -0,0 +1,104 @@
+"""Overlapping-release regression check.
+
+Parks a car, then fires the same Release from several logged-in clients
+at once, over a number of rounds. Fails unless every stay is counted
+exactly once: lot_daily_stats sessions and revenue must match the
+completed reservations, user_stats must show no active reservations, and
+the lot must end up empty.
+
+    python benchmarks/release_race.py --rounds 20 --threads 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP, 'release.db')}"
+
+from app import create_app  # noqa: E402
+from models import db, LotDailyStats, ParkingLot, Reservation, UserStats  # noqa: E402
+import seed  # noqa: E402
+
+app = create_app(JOBS_IN_PROCESS=False)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=4)
+    return parser.parse_args()
+
+
+def race(clients, reservation_id):
+    barrier = threading.Barrier(len(clients))
+
+    def release(client):
+        barrier.wait()
+        client.post(f'/user/release/{reservation_id}')
+
+    threads = [threading.Thread(target=release, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    args = parse_args()
+    with app.app_context():
+        db.create_all()
+        seed.seed_admin()
+        seed.seed_cities()
+        seed.seed_users()
+        seed.seed_parking_lots_and_spots()
+
+    clients = [app.test_client() for _ in range(args.threads)]
+    for client in clients:
+        client.post('/login', data={'username': 'johndoe', 'password': 'password123'})
+
+    for i in range(args.rounds):
+        clients[0].post('/user/reserve/1', data={'vehicle_number': f'KA01RR{i:04d}'})
+        with app.app_context():
+            reservation_id = db.session.query(Reservation.id).filter_by(is_active=True).scalar()
+        race(clients, reservation_id)
+
+    errors = []
+    with app.app_context():
+        stays, revenue = db.session.query(
+            db.func.count(), db.func.coalesce(db.func.sum(Reservation.parking_cost), 0)
+        ).filter(Reservation.is_active == False).one()
+        sessions, rolled_up = db.session.query(
+            db.func.coalesce(db.func.sum(LotDailyStats.sessions), 0),
+            db.func.coalesce(db.func.sum(LotDailyStats.revenue), 0)
+        ).one()
+        visits, active = db.session.query(
+            db.func.coalesce(db.func.sum(UserStats.visits), 0),
+            db.func.coalesce(db.func.sum(UserStats.active), 0)
+        ).one()
+        lot = db.session.get(ParkingLot, 1)
+
+        if stays != args.rounds:
+            errors.append(f"{stays} completed reservation(s) for {args.rounds} stays")
+        if sessions != stays:
+            errors.append(f"lot_daily_stats counts {sessions} session(s) for {stays} stay(s)")
+        if abs(rolled_up - revenue) > 1e-6:
+            errors.append(f"lot_daily_stats revenue {rolled_up} differs from billed {revenue}")
+        if visits != args.rounds or active != 0:
+            errors.append(f"user_stats shows {visits} visit(s), {active} active")
+        if lot.occupied != 0:
+            errors.append(f"lot 1 still shows {lot.occupied} occupied spot(s)")
+
+    print(f"{args.rounds} stays released by {args.threads} clients at once.")
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Every stay was billed and rolled up once.")
+
+
+if __name__ == '__main__':
+    main()
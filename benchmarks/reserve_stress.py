@@ -0,0 +1,123 @@
+"""Concurrent reservation stress test for the spot allocator.
+
+Spins up several threads that reserve spots in the same lot until it is
+full, then checks that no spot was handed out twice and that the lot
+counters match the spots. Exits non-zero if any invariant is broken.
+
+    python benchmarks/reserve_stress.py --threads 16 --spots 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import func
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocator import claim_spot  # noqa: E402
+from models import db, City, ParkingLot, ParkingSpot, Reservation, User  # noqa: E402
+
+
+def build_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    db.init_app(app)
+    return app
+
+
+def setup_lot(app, spots):
+    with app.app_context():
+        db.create_all()
+        city = City(name='Bengaluru', state='Karnataka')
+        user = User(username='stress', full_name='Stress Test', email='stress@example.com', password_hash='x')
+        db.session.add_all([city, user])
+        db.session.flush()
+        lot = ParkingLot(city_id=city.id, prime_location_name='Stress Lot', price_per_hour=10,
+                         max_spots=spots, available=spots)
+        db.session.add(lot)
+        db.session.flush()
+        db.session.execute(db.insert(ParkingSpot), [{'lot_id': lot.id, 'status': 'A'}] * spots)
+        db.session.commit()
+        return lot.id, user.id
+
+
+def worker(app, lot_id, user_id, results, index):
+    reserved = 0
+    with app.app_context():
+        while True:
+            claim = claim_spot(lot_id)
+            if claim is None:
+                db.session.rollback()
+                break
+            db.session.add(Reservation(spot_id=claim.spot_id, user_id=user_id,
+                                       vehicle_number=f'T{index:02d}{reserved:06d}',
+                                       parking_timestamp=datetime.utcnow(), is_active=True))
+            db.session.commit()
+            reserved += 1
+    results[index] = reserved
+
+
+def check(app, lot_id, spots):
+    errors = []
+    with app.app_context():
+        total = Reservation.query.count()
+        distinct = db.session.query(func.count(func.distinct(Reservation.spot_id))).scalar()
+        free = ParkingSpot.query.filter_by(lot_id=lot_id, status='A').count()
+        lot = db.session.get(ParkingLot, lot_id)
+
+        if total != spots:
+            errors.append(f"expected {spots} reservations, got {total}")
+        if distinct != total:
+            errors.append(f"{total - distinct} spot(s) were double-booked")
+        if free:
+            errors.append(f"{free} spot(s) left free after the lot reported full")
+        if (lot.occupied, lot.available) != (spots, 0):
+            errors.append(f"counters drifted: occupied={lot.occupied} available={lot.available}")
+        if claim_spot(lot_id) is not None:
+            errors.append("claim_spot succeeded on a full lot")
+        db.session.rollback()
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--spots', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, 'stress.db'))
+        lot_id, user_id = setup_lot(app, args.spots)
+
+        results = [0] * args.threads
+        threads = [threading.Thread(target=worker, args=(app, lot_id, user_id, results, i))
+                   for i in range(args.threads)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        errors = check(app, lot_id, args.spots)
+        with app.app_context():
+            db.engine.dispose()
+
+    print(f"{sum(results)} reservations by {args.threads} threads in {elapsed:.2f}s "
+          f"({sum(results) / elapsed:.0f} reservations/s)")
+    print(f"per thread: {results}")
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ No spot was double-booked.")
+
+
+if __name__ == '__main__':
+    main()
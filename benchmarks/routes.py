@@ -0,0 +1,267 @@
+"""Route benchmark suite.
+
+Generates synthetic datasets of increasing size (see seed.DATASET_SIZES),
+runs every admin.*, user.* and api.* route through the Flask test client
+and reports p50/p95 latency and SQL queries per request. Results can be
+saved as a baseline and compared against later runs.
+
+    python benchmarks/routes.py --sizes small,medium --save benchmarks/baseline.json
+    python benchmarks/routes.py --sizes small --compare benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp()
+DB_PATH = os.path.join(TMP, 'routes.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from flask import has_request_context  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from app import create_app  # noqa: E402
+from database import database  # noqa: E402
+from models import db, ParkingLot, Reservation  # noqa: E402
+import seed  # noqa: E402
+
+app = create_app(JOBS_REPORT_DIR=os.path.join(TMP, 'reports'))
+
+BLUEPRINTS = ('admin', 'user', 'api')
+
+# A regression is flagged when p95 latency grows by more than this factor
+# plus a few milliseconds of timer noise, or when a route issues more
+# queries than in the baseline.
+LATENCY_TOLERANCE = 1.5
+LATENCY_SLACK_MS = 5
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            self.count += 1
+
+
+class Bench:
+    """Runs requests and records latency and query count per endpoint."""
+
+    def __init__(self, client, counter):
+        self.client = client
+        self.counter = counter
+        self.samples = {}
+
+    def login(self, username, password):
+        self.client.get('/logout')
+        response = self.client.post('/login', data={'username': username, 'password': password})
+        assert response.status_code == 302, f"login failed for {username}"
+
+    def request(self, endpoint, method, url, **kwargs):
+        self.counter.count = 0
+        started = time.perf_counter()
+        response = self.client.open(url, method=method, **kwargs)
+        # Stream the whole body so streaming endpoints are timed end to end.
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        assert response.status_code < 400, f"{method} {url} returned {response.status_code}"
+        self.samples.setdefault(endpoint, []).append((elapsed, self.counter.count))
+        return response
+
+
+    def first_event(self, endpoint, url, event):
+        """Time an event stream until `event` arrives, then hang up."""
+        self.counter.count = 0
+        started = time.perf_counter()
+        response = self.client.get(url, buffered=False)
+        for chunk in response.response:
+            if f'event: {event}' in (chunk.decode() if isinstance(chunk, bytes) else chunk):
+                break
+        elapsed = time.perf_counter() - started
+        response.close()
+        assert response.status_code < 400, f"GET {url} returned {response.status_code}"
+        self.samples.setdefault(endpoint, []).append((elapsed, self.counter.count))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_routes(bench, repeat):
+    with app.app_context():
+        lot_id = db.session.query(ParkingLot.id).order_by(ParkingLot.available.desc()).first()[0]
+        lot = db.session.get(ParkingLot, lot_id)
+        lot_form = {
+            'prime_location_name': lot.prime_location_name, 'address': lot.address,
+            'pin_code': lot.pin_code, 'price_per_hour': lot.price_per_hour,
+            'max_spots': lot.max_spots, 'city_id': lot.city_id
+        }
+        search_term = lot.prime_location_name.split()[0]
+
+    # user000001 is the most frequent parker in generated datasets.
+    bench.login('user000001', seed.GENERATED_PASSWORD)
+    for i in range(repeat):
+        bench.request('user.dashboard', 'GET', '/user/dashboard')
+        bench.request('user.dashboard', 'GET', f'/user/dashboard?search={search_term}')
+        bench.request('user.reserve_spot', 'POST', f'/user/reserve/{lot_id}',
+                      data={'vehicle_number': f'BN01XX{i:04d}'})
+        with app.app_context():
+            reservation_id = (
+                db.session.query(Reservation.id)
+                .filter_by(user_id=1, is_active=True)
+                .order_by(Reservation.id.desc())
+                .first()[0]
+            )
+        html = bench.request('user.my_reservations', 'GET', '/user/my-reservations').get_data(as_text=True)
+        cursor = re.search(r'let cursor = "([^"]+)"', html)
+        if cursor:
+            bench.request('user.completed_reservations', 'GET',
+                          f'/user/my-reservations/completed?cursor={cursor.group(1)}')
+        bench.request('user.summary', 'GET', '/user/summary')
+        bench.request('user.release_spot', 'POST', f'/user/release/{reservation_id}')
+
+        bench.request('api.get_all_lots', 'GET', '/api/lots')
+        bench.request('api.get_spots', 'GET', f'/api/lots/{lot_id}/spots')
+        bench.request('api.search_lots', 'GET', f'/api/lots/search?q={search_term}')
+        bench.request('api.get_all_reservations', 'GET', '/api/reservations?limit=100')
+        bench.first_event('api.stream_lots', '/api/lots/stream', 'snapshot')
+
+    bench.login('admin', 'admin123')
+    for i in range(repeat):
+        bench.request('admin.dashboard', 'GET', '/admin/dashboard')
+        bench.request('admin.view_lot', 'GET', f'/admin/lots/{lot_id}/spots')
+        bench.request('admin.view_users', 'GET', '/admin/users')
+        bench.request('admin.view_users', 'GET', '/admin/users?search=user0001')
+        bench.request('admin.summary', 'GET', '/admin/summary')
+        grid = '/admin/summary/reservations'
+        page = bench.request('admin.summary_reservations', 'GET', grid).get_json()
+        bench.request('admin.summary_reservations', 'GET', f"{grid}?cursor={page['next_cursor']}")
+        bench.request('admin.summary_reservations', 'GET', f'{grid}?lot_id={lot_id}&sort=id&order=asc')
+        bench.request('admin.summary_reservations', 'GET', f'{grid}?user_id=1&vehicle=KA')
+        bench.request('admin.export', 'GET', f'/admin/export/revenue.csv?lot_id={lot_id}')
+        bench.request('admin.export', 'GET', f'/admin/export/reservations.xlsx?lot_id={lot_id}&start=2026-01-01')
+        job = bench.request('admin.generate_report', 'POST',
+                            f'/admin/reports/reservations.csv?lot_id={lot_id}').get_json()
+        while job['status'] in ('queued', 'running'):
+            time.sleep(0.01)
+            job = bench.request('api.get_job', 'GET', job['status_url']).get_json()
+        bench.request('admin.report_file', 'GET', job['download_url'])
+        bench.request('admin.jobs', 'GET', '/admin/jobs')
+        bench.request('admin.perf', 'GET', '/admin/perf')
+        bench.request('admin.perf', 'GET', '/admin/perf?format=json')
+        bench.request('admin.create_lot', 'GET', '/admin/create-lot')
+        bench.request('admin.create_lot', 'POST', '/admin/create-lot', data=dict(
+            lot_form, prime_location_name=f'Bench Lot {i}', max_spots=100))
+        with app.app_context():
+            new_lot_id = db.session.query(ParkingLot.id).order_by(ParkingLot.id.desc()).first()[0]
+        bench.request('admin.edit_lot', 'GET', f'/admin/edit-lot/{lot_id}')
+        bench.request('admin.edit_lot', 'POST', f'/admin/edit-lot/{lot_id}', data=lot_form)
+        bench.request('admin.delete_lot', 'POST', f'/admin/lots/{new_lot_id}/delete')
+
+
+def uncovered_endpoints(bench):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()
+                 if rule.endpoint.split('.')[0] in BLUEPRINTS}
+    return sorted(endpoints - set(bench.samples))
+
+
+def benchmark_size(size, repeat):
+    if os.path.exists(DB_PATH):
+        with app.app_context():
+            db.engine.dispose()
+            database.dispose()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(DB_PATH + suffix):
+                os.remove(DB_PATH + suffix)
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        seed.seed_admin()
+        counts = seed.generate_dataset(**seed.DATASET_SIZES[size])
+        print(f"\n== {size}: {counts} (built in {time.perf_counter() - started:.1f}s)")
+        counter = QueryCounter()
+        # On the Engine class so the read-only pool is counted too.
+        event.listen(Engine, 'before_cursor_execute', counter)
+
+    bench = Bench(app.test_client(), counter)
+    try:
+        # One untimed round first, so caches and connections are warm.
+        run_routes(bench, 1)
+        bench.samples.clear()
+        run_routes(bench, repeat)
+    finally:
+        with app.app_context():
+            event.remove(Engine, 'before_cursor_execute', counter)
+
+    missing = uncovered_endpoints(bench)
+    if missing:
+        raise SystemExit(f"❌ No benchmark for: {', '.join(missing)}")
+
+    results = {}
+    for endpoint, samples in sorted(bench.samples.items()):
+        latencies = [elapsed * 1000 for elapsed, _ in samples]
+        results[endpoint] = {
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'queries': max(queries for _, queries in samples),
+            'samples': len(samples)
+        }
+    return results
+
+
+def report(size, results, baseline=None):
+    regressions = []
+    print(f"{'endpoint':28} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}   vs baseline")
+    for endpoint, result in results.items():
+        line = f"{endpoint:28} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['queries']:8d}"
+        before = (baseline or {}).get(size, {}).get(endpoint)
+        if before:
+            line += f"   p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f}, queries {before['queries']} -> {result['queries']}"
+            if (result['p95_ms'] > before['p95_ms'] * LATENCY_TOLERANCE + LATENCY_SLACK_MS
+                    or result['queries'] > before['queries']):
+                regressions.append(f"{size} {endpoint}")
+                line += "  ⚠️"
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='small',
+                        help=f"comma-separated dataset sizes from {sorted(seed.DATASET_SIZES)}")
+    parser.add_argument('--repeat', type=int, default=10, help="requests per route per size")
+    parser.add_argument('--save', metavar='PATH', help="write the results as a baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare against a saved baseline")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    all_results = {}
+    regressions = []
+    for size in args.sizes.split(','):
+        all_results[size] = benchmark_size(size, args.repeat)
+        regressions += report(size, all_results[size], baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(all_results, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.save}")
+    if regressions:
+        print(f"\n❌ Regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
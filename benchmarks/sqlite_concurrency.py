@@ -0,0 +1,241 @@
+"""SQLite concurrency benchmark: default settings vs. the tuned database layer.
+
+Runs the same mixed workload twice on a fresh generated dataset: writer
+threads reserve and release spots through the allocator while reader
+threads run the admin revenue report. The first run uses SQLAlchemy's
+and SQLite's defaults (rollback journal, synchronous=FULL, shared pool);
+the second uses database.py's settings (WAL, synchronous=NORMAL, busy
+timeout, larger cache, mmap and a separate read-only pool). Reports
+throughput, write latency and "database is locked" failures for both.
+
+If gevent is installed, the tuned settings then run twice more in a copy
+of this script patched by gevent, as under gunicorn.conf.py: the writers
+and readers are greenlets, and another process takes the write lock for
+100 ms at a time, as a second worker would. A probe greenlet measures
+the longest the worker went without running it ("stall"), which is how
+long every open stream on the worker froze. The first gevent run sends
+statements through gevent's threadpool (DB_GEVENT_THREADPOOL, the
+default); the second runs them on the hub.
+
+    python benchmarks/sqlite_concurrency.py --writers 8 --readers 4 --duration 10
+"""
+import sys
+
+# Patch before anything else is imported, as gunicorn.conf.py does.
+GEVENT = '--gevent' in sys.argv
+if GEVENT:
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse  # noqa: E402
+import importlib.util  # noqa: E402
+import os  # noqa: E402
+import subprocess  # noqa: E402
+import tempfile  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+from datetime import datetime  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORK_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'unused.db')}"
+
+from flask import Flask, g  # noqa: E402
+from sqlalchemy import func  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from allocator import claim_spot, free_spot  # noqa: E402
+from database import database  # noqa: E402
+from models import db, ParkingLot, ParkingSpot, Reservation  # noqa: E402
+import seed  # noqa: E402
+
+DATASET = dict(cities=5, lots_per_city=4, spots_per_lot=100, users=200, reservations=200000)
+
+DEFAULT_SETTINGS = {
+    'SQLITE_JOURNAL_MODE': None,
+    'SQLITE_SYNCHRONOUS': None,
+    'SQLITE_BUSY_TIMEOUT': None,
+    'SQLITE_CACHE_SIZE': None,
+    'SQLITE_MMAP_SIZE': None,
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_READ_POOL': False,
+}
+TUNED_SETTINGS = {}
+HUB_SETTINGS = {'DB_GEVENT_THREADPOOL': False}
+
+# Another process taking the write lock, for the gevent runs.
+LOCK_HOLDER = """
+import sqlite3, sys, time
+connection = sqlite3.connect(sys.argv[1], isolation_level=None)
+connection.execute('PRAGMA busy_timeout = 5000')
+while True:
+    connection.execute('BEGIN IMMEDIATE')
+    time.sleep(float(sys.argv[2]))
+    connection.execute('COMMIT')
+    time.sleep(float(sys.argv[2]))
+"""
+LOCK_HOLD_SECONDS = 0.1
+
+
+def build_app(name, settings):
+    app = Flask(name)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(WORK_DIR, name + '.db')}"
+    app.config.update(settings)
+    database.init_app(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        seed.generate_dataset(**DATASET)
+    return app
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.reads = 0
+        self.locked = 0
+        self.write_latencies = []
+        self.stall = None
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                if name == 'write_latency':
+                    self.write_latencies.append(value)
+                else:
+                    setattr(self, name, getattr(self, name) + value)
+
+
+def next_request():
+    """Under gevent, yield as a request would when it writes its response."""
+    if GEVENT:
+        time.sleep(0)
+
+
+def writer(app, stop, stats, user_id, index):
+    with app.app_context():
+        sequence = 0
+        while not stop.is_set():
+            next_request()
+            started = time.perf_counter()
+            try:
+                lot_id = index % DATASET['cities'] * DATASET['lots_per_city'] + 1
+                claim = claim_spot(lot_id)
+                if claim is None:
+                    db.session.rollback()
+                    continue
+                reservation = Reservation(spot_id=claim.spot_id, user_id=user_id,
+                                          vehicle_number=f'W{index:02d}{sequence:06d}',
+                                          parking_timestamp=datetime.utcnow(), is_active=True)
+                db.session.add(reservation)
+                db.session.commit()
+
+                free_spot(claim.spot_id)
+                reservation.is_active = False
+                reservation.leaving_timestamp = datetime.utcnow()
+                reservation.parking_cost = 0
+                db.session.commit()
+                stats.add(writes=2, write_latency=time.perf_counter() - started)
+            except OperationalError as error:
+                db.session.rollback()
+                if 'locked' not in str(error):
+                    raise
+                stats.add(locked=1)
+            sequence += 1
+
+
+def reader(app, stop, stats):
+    with app.app_context():
+        g.read_only = True
+        while not stop.is_set():
+            next_request()
+            try:
+                (
+                    db.session.query(ParkingLot.prime_location_name, func.sum(Reservation.parking_cost))
+                    .join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)
+                    .join(Reservation, Reservation.spot_id == ParkingSpot.id)
+                    .filter(Reservation.is_active == False)
+                    .group_by(ParkingLot.prime_location_name)
+                    .all()
+                )
+                db.session.rollback()
+                stats.add(reads=1)
+            except OperationalError as error:
+                db.session.rollback()
+                if 'locked' not in str(error):
+                    raise
+                stats.add(locked=1)
+
+
+def probe(stop, stats, interval=0.01):
+    """Track the longest a greenlet waiting on a timer went without running."""
+    stats.stall = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        time.sleep(interval)
+        stats.stall = max(stats.stall, time.perf_counter() - started - interval)
+
+
+def run(app, writers, readers, duration):
+    stats = Stats()
+    stop = threading.Event()
+    threads = [threading.Thread(target=writer, args=(app, stop, stats, i + 1, i)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(app, stop, stats)) for _ in range(readers)]
+    holder = None
+    if GEVENT:
+        threads.append(threading.Thread(target=probe, args=(stop, stats)))
+        with app.app_context():
+            path = db.engine.url.database
+        holder = subprocess.Popen([sys.executable, '-c', LOCK_HOLDER, path, str(LOCK_HOLD_SECONDS)])
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if holder is not None:
+        holder.kill()
+        holder.wait()
+    return stats
+
+
+def report(name, stats, duration):
+    latencies = sorted(stats.write_latencies) or [0]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    stall = '-' if stats.stall is None else f"{stats.stall * 1000:.1f}"
+    print(f"{name:12} {stats.writes / duration:10.1f} {stats.reads / duration:10.1f} "
+          f"{p95 * 1000:12.1f} {stats.locked:8d} {stall:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--gevent', action='store_true', help="run the gevent comparison only")
+    args = parser.parse_args()
+
+    if GEVENT:
+        runs = (('gevent', TUNED_SETTINGS), ('gevent, hub', HUB_SETTINGS))
+    else:
+        runs = (('default', DEFAULT_SETTINGS), ('tuned', TUNED_SETTINGS))
+    results = {}
+    for name, settings in runs:
+        app = build_app(name.replace(', ', '-'), settings)
+        results[name] = run(app, args.writers, args.readers, args.duration)
+
+    if not GEVENT:
+        print(f"\n{'':12} {'writes/s':>10} {'reports/s':>10} {'p95 pair ms':>12} {'locked':>8} {'stall ms':>10}")
+    for name, stats in results.items():
+        report(name, stats, args.duration)
+    sys.stdout.flush()
+
+    if not GEVENT and importlib.util.find_spec('gevent') is not None:
+        subprocess.run([sys.executable, __file__, '--gevent', '--writers', str(args.writers),
+                        '--readers', str(args.readers), '--duration', str(args.duration)], check=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Worker startup-time budget.
+
+Starts fresh interpreters that import the app and call create_app() the
+way production.py does, and reports the median time taken, plus the
+extra cost of the `flask` command line setup. Fails if the median is over
+budget or if any of the heavy modules below is imported before a request
+needs it.
+
+    python benchmarks/startup_time.py --runs 7 --budget-ms 750
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only: Excel exports, bulk pricing, `flask db`.
+HEAVY_MODULES = ('numpy', 'pandas', 'openpyxl', 'alembic', 'flask_migrate')
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app('config.ProductionConfig', cli=False)
+worker = time.perf_counter() - started
+heavy = [name for name in {heavy!r} if name in sys.modules]
+started = time.perf_counter()
+create_app('config.ProductionConfig')
+print(json.dumps({{'worker': worker, 'cli': time.perf_counter() - started, 'heavy': heavy}}))
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--budget-ms', type=float, default=750,
+                        help="maximum median time to import the app and build it")
+    return parser.parse_args()
+
+
+def probe(env):
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    args = parse_args()
+    env = dict(
+        os.environ,
+        SECRET_KEY='startup-benchmark',
+        DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}",
+    )
+    env.pop('APP_CONFIG', None)
+
+    probe(env)  # warm the bytecode and OS file caches
+    samples = [probe(env) for _ in range(args.runs)]
+    worker = sorted(sample['worker'] * 1000 for sample in samples)
+    cli = sorted(sample['cli'] * 1000 for sample in samples)
+    median = worker[len(worker) // 2]
+
+    print(f"{args.runs} runs: import + create_app() median {median:.0f} ms "
+          f"(min {worker[0]:.0f}, max {worker[-1]:.0f}); "
+          f"`flask` commands add {cli[len(cli) // 2]:.0f} ms")
+
+    errors = []
+    if median > args.budget_ms:
+        errors.append(f"median startup {median:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    for heavy in sorted({name for sample in samples for name in sample['heavy']}):
+        errors.append(f"{heavy} is imported at startup")
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ Workers start within budget without loading heavy modules.")
+
+
+if __name__ == '__main__':
+    main()
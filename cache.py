@@ -0,0 +1,142 @@
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, City, ParkingLot
+
+# Cache keys. Each one names a group of entries that are loaded and
+# invalidated together.
+CITIES = 'cities'
+LOTS = 'lots'
+
+# Which keys go stale when a row of a given model changes.
+INVALIDATED_BY = {
+    City: (CITIES, LOTS),
+    ParkingLot: (LOTS,),
+}
+
+
+class _Store:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = {}
+        self.misses = {}
+
+
+class ReferenceCache:
+    """In-process cache for reference data that rarely changes.
+
+    Cities, states and lot metadata (names, addresses, prices, capacity) are
+    kept here; live occupancy is not. Entries are dropped as soon as a
+    session commits a change to a City or ParkingLot row in this process,
+    and expire after REFERENCE_CACHE_TTL seconds so that other worker
+    processes pick up the change too.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REFERENCE_CACHE_TTL', 300)
+        app.extensions['reference_cache'] = _Store(app.config['REFERENCE_CACHE_TTL'])
+
+    @property
+    def _store(self):
+        return current_app.extensions['reference_cache']
+
+    def get(self, key, loader):
+        store = self._store
+        now = time.monotonic()
+        with store.lock:
+            entry = store.entries.get(key)
+            if entry and entry[0] > now:
+                store.hits[key] = store.hits.get(key, 0) + 1
+                return entry[1]
+            store.misses[key] = store.misses.get(key, 0) + 1
+
+        # Load outside the lock; two threads missing together just both load.
+        value = loader()
+        with store.lock:
+            store.entries[key] = (now + store.ttl, value)
+        return value
+
+    def invalidate(self, *keys):
+        store = self._store
+        with store.lock:
+            for key in keys or list(store.entries):
+                store.entries.pop(key, None)
+
+    def stats(self):
+        store = self._store
+        with store.lock:
+            keys = sorted(set(store.hits) | set(store.misses))
+            return {
+                key: {
+                    'hits': store.hits.get(key, 0),
+                    'misses': store.misses.get(key, 0),
+                    'cached': key in store.entries
+                }
+                for key in keys
+            }
+
+    def cities(self):
+        """All cities as (id, name, state) rows, ordered by name."""
+        return self.get(CITIES, lambda: (
+            db.session.query(City.id, City.name, City.state)
+            .order_by(City.name)
+            .all()
+        ))
+
+    def states(self):
+        return sorted({city.state for city in self.cities()})
+
+    def city_names(self):
+        return sorted({city.name for city in self.cities()})
+
+    def lots(self):
+        """Lot metadata keyed by lot id. Occupancy counters are not included."""
+        return self.get(LOTS, lambda: {
+            lot.id: lot for lot in (
+                db.session.query(
+                    ParkingLot.id,
+                    ParkingLot.prime_location_name,
+                    ParkingLot.address,
+                    ParkingLot.pin_code,
+                    ParkingLot.price_per_hour,
+                    ParkingLot.max_spots,
+                    ParkingLot.city_id,
+                    City.name.label('city_name'),
+                    City.state.label('city_state')
+                )
+                .join(City, City.id == ParkingLot.city_id)
+                .all()
+            )
+        })
+
+
+reference_cache = ReferenceCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_stale_keys(session, flush_context):
+    stale = session.info.setdefault('stale_reference_keys', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        stale.update(INVALIDATED_BY.get(type(obj), ()))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_stale_keys(session):
+    stale = session.info.pop('stale_reference_keys', None)
+    if stale and has_app_context() and 'reference_cache' in current_app.extensions:
+        reference_cache.invalidate(*stale)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stale_keys(session):
+    session.info.pop('stale_reference_keys', None)
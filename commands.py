@@ -0,0 +1,113 @@
+"""`flask` maintenance commands, attached by app.create_app()."""
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+
+from models import db
+import search as lot_search
+
+
+def run_handler(kind):
+    """Run a maintenance job's handler in this process, as the job would.
+    Returns its result."""
+    from jobs import HANDLERS
+    return HANDLERS[kind]({})
+
+
+@click.command('reconcile-counters')
+@with_appcontext
+def reconcile_counters():
+    """Rebuild the per-lot occupied/available counters from parking_spot."""
+    result = run_handler('reconcile-counters')
+    print(f"✅ Reconciled occupancy counters for {result['lots']} lot(s).")
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index():
+    """Rebuild the full-text lot and user search indexes."""
+    lots = lot_search.rebuild_index()
+    users = lot_search.rebuild_user_index()
+    db.session.commit()
+    print(f"✅ Indexed {lots} lot(s) and {users} user(s) for search.")
+
+
+@click.command('rebill')
+@with_appcontext
+def rebill():
+    """Reprice all completed, unarchived reservations at their lot's current rate."""
+    result = run_handler('rebill')
+    print(f"✅ Repriced {result['repriced']} reservation(s); {result['changed']} cost(s) changed.")
+    if result['changed']:
+        print("✅ Rebuilt daily lot statistics and user totals.")
+
+
+@click.command('backfill-daily-stats')
+@with_appcontext
+def backfill_daily_stats():
+    """Rebuild lot_daily_stats from the completed reservations."""
+    result = run_handler('backfill-daily-stats')
+    print(f"✅ Rebuilt {result['rows']} daily lot statistic row(s).")
+
+
+@click.command('archive-reservations')
+@click.option('--days', default=365, show_default=True, help="Archive reservations that ended more than this many days ago.")
+@click.option('--batch-size', default=5000, show_default=True)
+@with_appcontext
+def archive_old_reservations(days, batch_size):
+    """Move old completed reservations into reservation_archive."""
+    from archive import archive_reservations
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = archive_reservations(cutoff, batch_size)
+    print(f"✅ Archived {moved} reservation(s) that ended before {cutoff:%Y-%m-%d %H:%M}.")
+
+
+@click.command('backfill-user-stats')
+@with_appcontext
+def backfill_user_stats():
+    """Rebuild user_stats from the reservation history."""
+    result = run_handler('backfill-user-stats')
+    print(f"✅ Rebuilt {result['rows']} user statistic row(s).")
+
+
+@click.command('run-jobs')
+@click.option('--workers', default=2, show_default=True, help="Jobs run at the same time.")
+@with_appcontext
+def run_jobs(workers):
+    """Run queued background jobs until interrupted."""
+    from jobs import job_runner
+    print(f"Running jobs with {workers} worker(s); press Ctrl+C to stop.")
+    job_runner.run_forever(workers)
+
+
+@click.command('prune-jobs')
+@click.option('--days', default=7, show_default=True, help="Delete jobs that finished more than this many days ago.")
+@with_appcontext
+def prune_old_jobs(days):
+    """Delete finished jobs and their report files."""
+    from jobs import prune_jobs
+    deleted = prune_jobs(datetime.utcnow() - timedelta(days=days))
+    db.session.commit()
+    print(f"✅ Deleted {deleted} finished job(s).")
+
+
+COMMANDS = (
+    reconcile_counters,
+    rebuild_search_index,
+    rebill,
+    backfill_daily_stats,
+    archive_old_reservations,
+    backfill_user_stats,
+    run_jobs,
+    prune_old_jobs,
+)
+
+
+def init_app(app):
+    for command in COMMANDS:
+        app.cli.add_command(command)
+
+    # Flask-Migrate imports Alembic, so it is only set up with the commands.
+    from flask_migrate import Migrate
+    Migrate(app, db)
@@ -0,0 +1,34 @@
+"""Settings per environment, for create_app(config).
+
+Choose one with APP_CONFIG (an import path such as
+'config.ProductionConfig'); the default is Config. Extensions set their
+own defaults in init_app (see database.py, cache.py and friends), so only
+values that differ from those belong here.
+"""
+import os
+
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///vechile_parking.db')
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your_secret_key_here')
+    SQL_PROFILING = os.environ.get('SQL_PROFILING') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    # 0 leaves background jobs to `flask run-jobs`; see jobs.py.
+    JOBS_IN_PROCESS = os.environ.get('JOBS_IN_PROCESS', '1') != '0'
+
+
+class TestingConfig(Config):
+    TESTING = True
+    # In memory unless TEST_DATABASE_URL says otherwise, so every app
+    # created for a test starts from an empty database of its own.
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    BCRYPT_LOG_ROUNDS = 4
+
+
+class ProductionConfig(Config):
+    # No fallback: create_app() refuses to start without a real key.
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+    # gevent web workers would run jobs as greenlets, and a long report
+    # would stall every stream on the worker; run `flask run-jobs` instead.
+    JOBS_IN_PROCESS = os.environ.get('JOBS_IN_PROCESS', '0') != '0'
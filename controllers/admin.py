@@ -1,12 +1,35 @@
-from flask import Blueprint, render_template, request, redirect, flash, url_for
+from flask import (Blueprint, render_template, request, redirect, flash, url_for, jsonify, abort,
+                   Response, send_file, stream_with_context)
 from flask_login import login_required, current_user
-from models import db, ParkingLot, ParkingSpot, User, Reservation, City
-from decorators import admin_required
-from datetime import datetime
-from sqlalchemy import func,or_
+from models import (db, ParkingLot, ParkingSpot, User, Reservation, ReservationArchive, DataVersion,
+                    LotDailyStats, UserStats, Job)
+from cache import reference_cache
+from identity import identity_cache
+from perf import query_profiler
+from events import lot_events
+from jobs import MAINTENANCE_JOBS, job_runner, job_to_dict, report_path
+import search as lot_search
+from decorators import admin_required, read_only
+from provisioning import provision_spots, resize_lot
+from pricing import elapsed_minutes, parking_costs
+from reports import (EXPORTS, ReservationFilters, SORT_COLUMNS, count_reservations, filters_to_params,
+                     keyset_page, reservation_sources, reservation_to_dict)
+from exports import csv_chunks, xlsx_file
+from datetime import datetime, timedelta
+from sqlalchemy import func
+import hashlib
+import json
+import os
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+USERS_PER_PAGE = 50
+# Recent jobs listed on the jobs page.
+JOBS_LISTED = 50
+# Rows per page of the summary reservation grid.
+GRID_PAGE_SIZE = 50
+MAX_GRID_PAGE_SIZE = 200
+
 @admin_bp.route('/dashboard')
 @login_required
 @admin_required
@@ -15,31 +38,11 @@ def dashboard():
     state = request.args.get('state', '').strip().lower()
     city = request.args.get('city', '').strip().lower()
 
-    # Base query with join to City
-    query = ParkingLot.query.join(City).filter(True)
-
-    # Search by prime location or pincode
-    if search:
-        query = query.filter(
-            db.or_(
-                ParkingLot.prime_location_name.ilike(f"%{search}%"),
-                ParkingLot.pin_code.ilike(f"%{search}%")
-            )
-        )
-
-    # Filter by state
-    if state:
-        query = query.filter(City.state.ilike(f"%{state}%"))
-
-    # Filter by city
-    if city:
-        query = query.filter(City.name.ilike(f"%{city}%"))
+    lots = lot_search.filter_lots(search, state, city)
 
-    lots = query.all()
-
-    # Get list of all states and cities for dropdowns
-    states = [row[0] for row in db.session.query(City.state).distinct().all()]
-    cities = [row[0] for row in db.session.query(City.name).distinct().all()]
+    # Dropdown values come from the reference cache
+    states = reference_cache.states()
+    cities = reference_cache.city_names()
 
     return render_template(
         'admin/dashboard.html',
@@ -58,7 +61,7 @@ def dashboard():
 @login_required
 @admin_required
 def create_lot():
-    cities = City.query.all()
+    cities = reference_cache.cities()
 
     if request.method == 'POST':
         name = request.form['prime_location_name']
@@ -75,18 +78,20 @@ def create_lot():
             city_id=city_id,
             pin_code=pin_code,
             price_per_hour=price,
-            max_spots=max_spots
+            max_spots=max_spots,
+            available=max_spots
         )
 
         db.session.add(new_lot)
         db.session.flush()  # Get new_lot.id before commit
 
         # Auto-create empty spots
-        for _ in range(max_spots):
-            new_spot = ParkingSpot(lot_id=new_lot.id)
-            db.session.add(new_spot)
+        provision_spots(new_lot.id, max_spots)
+        lot_search.index_lot(new_lot.id)
+        DataVersion.bump(DataVersion.LOTS)
 
         db.session.commit()
+        lot_events.publish_occupancy(new_lot.id, 0, max_spots)
         flash('Parking lot created successfully with spots!')
         return redirect(url_for('admin.dashboard'))
 
@@ -99,17 +104,26 @@ def create_lot():
 @admin_required
 def edit_lot(lot_id):
     lot = ParkingLot.query.get_or_404(lot_id)
-    cities = City.query.all()
+    cities = reference_cache.cities()
 
     if request.method == 'POST':
         lot.prime_location_name = request.form['prime_location_name']
         lot.address = request.form['address']
         lot.pin_code = request.form['pin_code']
         lot.price_per_hour = float(request.form['price_per_hour'])
-        lot.max_spots = int(request.form['max_spots'])
         lot.city_id = int(request.form['city_id'])
+        max_spots = int(request.form['max_spots'])
 
+        if not resize_lot(lot, max_spots):
+            db.session.rollback()
+            flash(f"Cannot reduce the lot to {max_spots} spots: only {lot.available_spots()} spot(s) are free.", 'danger')
+            return redirect(url_for('admin.edit_lot', lot_id=lot_id))
+
+        db.session.flush()
+        lot_search.index_lot(lot.id)
+        DataVersion.bump(DataVersion.LOTS)
         db.session.commit()
+        lot_events.publish_occupancy(lot.id, lot.occupied, lot.available)
         flash('Parking lot updated successfully!', 'success')
         return redirect(url_for('admin.dashboard'))
 
@@ -134,8 +148,14 @@ def delete_lot(lot_id):
         flash("Cannot delete lot: some spots have active reservations.", "danger")
         return redirect(url_for('admin.dashboard'))
 
+    LotDailyStats.query.filter_by(lot_id=lot_id).delete(synchronize_session=False)
+    UserStats.query.filter_by(lot_id=lot_id).delete(synchronize_session=False)
+    ReservationArchive.query.filter_by(lot_id=lot_id).delete(synchronize_session=False)
     db.session.delete(lot)
+    lot_search.remove_lot(lot_id)
+    DataVersion.bump(DataVersion.LOTS)
     db.session.commit()
+    lot_events.publish_removed(lot_id)
 
     flash("Lot deleted successfully.")
     return redirect(url_for('admin.dashboard'))
@@ -148,17 +168,44 @@ def view_lot(lot_id):
     lot = ParkingLot.query.get_or_404(lot_id)
     filter_type = request.args.get('filter')
 
-    all_spots = ParkingSpot.query.filter_by(lot_id=lot.id).all()
+    all_spots = ParkingSpot.query.filter_by(lot_id=lot.id).order_by(ParkingSpot.id).all()
+
+    # Active reservation of each occupied spot, with its user, in one query
+    active = {
+        res.spot_id: res for res in (
+            Reservation.query
+            .options(db.joinedload(Reservation.user))
+            .join(ParkingSpot)
+            .filter(ParkingSpot.lot_id == lot.id, Reservation.is_active == True)
+            .all()
+        )
+    }
 
     if filter_type == 'available':
-        spots = [spot for spot in all_spots if not spot.reservation]
+        spots = [spot for spot in all_spots if spot.id not in active]
     elif filter_type == 'occupied':
-        spots = [spot for spot in all_spots if spot.reservation]
+        spots = [spot for spot in all_spots if spot.id in active]
     else:
         spots = all_spots
 
+    # Estimated cost so far for every active reservation, priced in one batch
     now = datetime.utcnow()
-    return render_template('admin/view_spots.html', lot=lot, spots=spots, now=now, filter=filter_type)
+    minutes = [elapsed_minutes(res.parking_timestamp, now) for res in active.values()]
+    costs = parking_costs([lot.price_per_hour] * len(minutes), minutes)
+    estimates = {
+        spot_id: {'minutes': total_minutes, 'cost': cost.item()}
+        for spot_id, total_minutes, cost in zip(active, minutes, costs)
+    }
+
+    return render_template(
+        'admin/view_spots.html',
+        lot=lot,
+        spots=spots,
+        active=active,
+        estimates=estimates,
+        now=now,
+        filter=filter_type
+    )
 
 # View all registered users
 
@@ -167,51 +214,106 @@ def view_lot(lot_id):
 @admin_required
 def view_users():
     search = request.args.get('search', '').strip().lower()
-
-    query = User.query
-    if search:
-        query = query.filter(
-            or_(
-                User.full_name.ilike(f"%{search}%"),
-                User.username.ilike(f"%{search}%"),
-                User.email.ilike(f"%{search}%")
+    after = request.args.get('after', type=int)
+
+    query = User.query.order_by(User.id)
+    matching_ids = lot_search.matching_user_ids(search)
+    if matching_ids is not None:
+        # Per-word prefix match through the user_search full-text index.
+        query = query.filter(User.id.in_(matching_ids))
+    if after is not None:
+        query = query.filter(User.id > after)
+
+    # One extra row tells us whether there is a next page.
+    users = query.limit(USERS_PER_PAGE + 1).all()
+    next_after = users[USERS_PER_PAGE - 1].id if len(users) > USERS_PER_PAGE else None
+    users = users[:USERS_PER_PAGE]
+
+    counts = {}
+    if users:
+        counts = {
+            user_id: (total, active or 0)
+            for user_id, total, active in (
+                db.session.query(UserStats.user_id, func.sum(UserStats.visits), func.sum(UserStats.active))
+                .filter(UserStats.user_id.in_([user.id for user in users]))
+                .group_by(UserStats.user_id)
+                .all()
             )
-        )
+        }
 
-    users = query.all()
-    return render_template('admin/user_list.html', users=users, search=search)
+    return render_template(
+        'admin/user_list.html',
+        users=users,
+        counts=counts,
+        search=search,
+        after=after,
+        next_after=next_after
+    )
 
 @admin_bp.route('/summary')
 @login_required
 @admin_required
+@read_only
 def summary():
-    # Count Data
-    total_lots = ParkingLot.query.count()
-    total_spots = ParkingSpot.query.count()
+    today = datetime.utcnow().date()
+    start, end = parse_day(request.args.get('start')), parse_day(request.args.get('end'))
+    if start and end and start > end:
+        start, end = end, start
+
+    # Count Data, from the stored lot counters
+    total_lots, total_occupied, total_available = db.session.query(
+        func.count(ParkingLot.id),
+        func.coalesce(func.sum(ParkingLot.occupied), 0),
+        func.coalesce(func.sum(ParkingLot.available), 0)
+    ).one()
+    total_spots = total_occupied + total_available
     total_users = User.query.filter_by(role='user').count()
 
-    # Revenue by Parking Lot
-    revenue_data = (
-        db.session.query(
-            ParkingLot.prime_location_name,
-            func.coalesce(func.sum(Reservation.parking_cost), 0)
-        )
-        .join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)
-        .join(Reservation, Reservation.spot_id == ParkingSpot.id)
-        .filter(Reservation.is_active == False)
-        .group_by(ParkingLot.prime_location_name)
+    # Revenue by Parking Lot and by day, from the daily rollup
+    in_range = []
+    if start:
+        in_range.append(LotDailyStats.day >= start)
+    if end:
+        in_range.append(LotDailyStats.day <= end)
+
+    lots = reference_cache.lots()
+    lot_stats = sorted(
+        (
+            {
+                'name': lots[lot_id].prime_location_name if lot_id in lots else f'Lot {lot_id}',
+                'revenue': revenue,
+                'sessions': sessions,
+                'occupied_hours': round(minutes / 60, 1)
+            }
+            for lot_id, revenue, sessions, minutes in db.session.query(
+                LotDailyStats.lot_id,
+                func.sum(LotDailyStats.revenue),
+                func.sum(LotDailyStats.sessions),
+                func.sum(LotDailyStats.occupied_minutes)
+            )
+            .filter(*in_range)
+            .group_by(LotDailyStats.lot_id)
+        ),
+        key=lambda row: row['name']
+    )
+    chart_labels = [row['name'] for row in lot_stats]
+    chart_values = [row['revenue'] for row in lot_stats]
+
+    daily = (
+        db.session.query(LotDailyStats.day, func.sum(LotDailyStats.revenue))
+        .filter(*in_range)
+        .group_by(LotDailyStats.day)
+        .order_by(LotDailyStats.day)
         .all()
     )
+    trend_labels = [day.isoformat() for day, _ in daily]
+    trend_values = [revenue for _, revenue in daily]
 
-    chart_labels = [lot for lot, _ in revenue_data]
-    chart_values = [revenue for _, revenue in revenue_data]
-
-    # Spot availability summary
-    total_available = ParkingSpot.query.filter_by(status='A').count()
-    total_occupied = ParkingSpot.query.filter_by(status='O').count()
-
-    # All reservations (with duration & status)
-    reservations = Reservation.query.order_by(Reservation.parking_timestamp.desc()).all()
+    presets = [
+        ('Last 7 days', today - timedelta(days=6), today),
+        ('Last 30 days', today - timedelta(days=29), today),
+        ('This year', today.replace(month=1, day=1), today),
+    ]
 
     return render_template(
         'admin/summary.html',
@@ -220,7 +322,173 @@ def summary():
         total_users=total_users,
         chart_labels=chart_labels,
         chart_values=chart_values,
+        trend_labels=trend_labels,
+        trend_values=trend_values,
+        lot_stats=lot_stats,
         available=total_available,
         occupied=total_occupied,
-        reservations=reservations
+        lots=sorted(lots.values(), key=lambda lot: lot.prime_location_name),
+        cities=reference_cache.cities(),
+        start=start,
+        end=end,
+        presets=presets
+    )
+
+
+@admin_bp.route('/summary/reservations')
+@login_required
+@admin_required
+@read_only
+def summary_reservations():
+    """One page of the summary reservation grid, as JSON."""
+    sort = request.args.get('sort', 'parked_at')
+    descending = request.args.get('order', 'desc') == 'desc'
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', GRID_PAGE_SIZE, type=int)
+    filters = report_filters()
+
+    if sort not in SORT_COLUMNS:
+        return jsonify({'error': f"'sort' must be one of: {', '.join(SORT_COLUMNS)}."}), 400
+    if limit < 1 or limit > MAX_GRID_PAGE_SIZE:
+        return jsonify({'error': f"'limit' must be between 1 and {MAX_GRID_PAGE_SIZE}."}), 400
+
+    try:
+        rows, next_cursor = keyset_page(reservation_sources(filters), sort, descending, cursor, limit)
+    except ValueError:
+        return jsonify({'error': "Invalid 'cursor'."}), 400
+
+    page = {'reservations': [reservation_to_dict(row) for row in rows], 'next_cursor': next_cursor}
+    # The total only changes with the filters, so later pages skip it.
+    if cursor is None:
+        page['total'], page['total_exact'] = count_reservations(filters)
+    return jsonify(page)
+
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+@admin_bp.route('/export/<name>.<fmt>')
+@login_required
+@admin_required
+@read_only
+def export(name, fmt):
+    """Reservations or daily revenue, filtered like the summary, as CSV or XLSX."""
+    if name not in EXPORTS or fmt not in ('csv', 'xlsx'):
+        abort(404)
+    rows, header, stem = EXPORTS[name]
+    rows = rows(report_filters())
+    download_name = f"{stem}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+
+    if fmt == 'csv':
+        # Sent as it is written; rows come from the database a chunk at a time.
+        response = Response(stream_with_context(csv_chunks(header, rows)), mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        return response
+    return send_file(
+        xlsx_file(stem.capitalize(), header, rows),
+        mimetype=XLSX_MIMETYPE,
+        as_attachment=True,
+        download_name=download_name
     )
+
+
+@admin_bp.route('/reports/<name>.<fmt>', methods=['POST'])
+@login_required
+@admin_required
+def generate_report(name, fmt):
+    """Queue an export as a background job; poll its status_url until it
+    has a download_url. Asking again for the same report while it is
+    pending returns the pending job."""
+    if name not in EXPORTS or fmt not in ('csv', 'xlsx'):
+        abort(404)
+    params = {'name': name, 'fmt': fmt, 'filters': filters_to_params(report_filters())}
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    job = Job.enqueue('export', params, dedupe_key=f'export:{digest}')
+    db.session.commit()
+    job_runner.notify()
+    return jsonify(job_to_dict(job)), 202
+
+
+@admin_bp.route('/reports/<int:job_id>')
+@login_required
+@admin_required
+def report_file(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or job.kind != 'export' or job.status != Job.SUCCEEDED:
+        abort(404)
+    path = report_path(job.result['file'])
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(
+        path,
+        mimetype=XLSX_MIMETYPE if job.params['fmt'] == 'xlsx' else 'text/csv',
+        as_attachment=True,
+        download_name=job.result['download_name']
+    )
+
+
+def report_filters():
+    """ReservationFilters from the query string of the summary grid or an export."""
+    start, end = parse_day(request.args.get('start')), parse_day(request.args.get('end'))
+    return ReservationFilters(
+        lot_id=request.args.get('lot_id', type=int),
+        city_id=request.args.get('city_id', type=int),
+        user_id=request.args.get('user_id', type=int),
+        vehicle=request.args.get('vehicle', '').strip() or None,
+        start=min(start, end) if start and end else start,
+        end=max(start, end) if start and end else end
+    )
+
+
+def parse_day(value):
+    """A YYYY-MM-DD query argument as a date, or None if missing or invalid."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+@admin_bp.route('/perf', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def perf():
+    if request.method == 'POST':
+        query_profiler.reset()
+        flash("Performance samples cleared.", "info")
+        return redirect(url_for('admin.perf'))
+
+    endpoints = query_profiler.report()
+    cache_stats = reference_cache.stats()
+    identity_stats = identity_cache.stats()
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'enabled': query_profiler.enabled,
+            'endpoints': endpoints,
+            'reference_cache': cache_stats,
+            'identity_cache': identity_stats
+        })
+
+    return render_template(
+        'admin/perf.html',
+        enabled=query_profiler.enabled,
+        endpoints=endpoints,
+        cache_stats=cache_stats,
+        identity_stats=identity_stats
+    )
+
+
+@admin_bp.route('/jobs', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def jobs():
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        if kind not in MAINTENANCE_JOBS:
+            abort(400)
+        # One pending job per kind; asking again returns that one.
+        job = Job.enqueue(kind, dedupe_key=kind)
+        db.session.commit()
+        job_runner.notify()
+        flash(f"{MAINTENANCE_JOBS[kind]} is queued as job #{job.id}.", "info")
+        return redirect(url_for('admin.jobs'))
+
+    recent = Job.query.order_by(Job.id.desc()).limit(JOBS_LISTED).all()
+    return render_template('admin/jobs.html', jobs=recent, maintenance=MAINTENANCE_JOBS)
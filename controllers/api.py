@@ -1,14 +1,69 @@
-from flask import Blueprint, jsonify
-from models import db, ParkingLot, ParkingSpot, Reservation
+import json
+from datetime import datetime
+from flask import Blueprint, current_app, g, jsonify, request, Response, stream_with_context
+from flask_login import current_user
+import search as lot_search
+from events import lot_events, lot_counters
+from jobs import job_to_dict
+from models import db, City, DataVersion, Job, ParkingLot, ParkingSpot, Reservation
+from reports import ReservationFilters, keyset_page, merged_by_id, reservation_sources, reservation_to_dict
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 1000
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+STREAM_HEARTBEAT_SECONDS = 15
+
+@api_bp.before_request
+def use_read_pool():
+    # Every /api route is a read; keep them off the write connections.
+    g.read_only = True
+
 def error_response(message, code=404):
     return jsonify({'error': message}), code
 
+def not_modified(etag):
+    """Return a 304 if the client already holds this version, else None."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @api_bp.route('/lots', methods=['GET'])
 def get_all_lots():
-    lots = ParkingLot.query.all()
+    etag = f"lots-{DataVersion.current(DataVersion.LOTS)}"
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    lots = (
+        db.session.query(
+            ParkingLot.id,
+            ParkingLot.prime_location_name,
+            ParkingLot.address,
+            ParkingLot.pin_code,
+            City.name.label('city_name'),
+            City.state.label('city_state'),
+            ParkingLot.price_per_hour,
+            ParkingLot.max_spots,
+            ParkingLot.available,
+            ParkingLot.occupied
+        )
+        .join(City, City.id == ParkingLot.city_id)
+        .order_by(ParkingLot.id)
+        .all()
+    )
     if not lots:
         return error_response("No parking lots found.")
 
@@ -20,65 +75,199 @@ def get_all_lots():
             'address': lot.address,
             'pin_code': lot.pin_code,
             'city': {
-                'name': lot.city.name,
-                'state': lot.city.state
+                'name': lot.city_name,
+                'state': lot.city_state
             },
             'price_per_hour': lot.price_per_hour,
             'max_spots': lot.max_spots,
-            'available_spots': lot.available_spots(),
-            'occupied_count': lot.occupied_count()
+            'available_spots': lot.available,
+            'occupied_count': lot.occupied
+        })
+    return with_etag(jsonify({'lots': data}), etag), 200
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def lots_snapshot():
+    counters = lot_counters()
+    # Don't hold a pooled connection for the life of the stream.
+    db.session.close()
+    return {'lots': [
+        {'lot_id': lot_id, 'available': available, 'occupied': occupied}
+        for lot_id, (occupied, available) in sorted(counters.items())
+    ]}
+
+
+@api_bp.route('/lots/stream', methods=['GET'])
+def stream_lots():
+    # Subscribe before taking the snapshot so nothing falls in between.
+    subscription = lot_events.subscribe()
+    snapshot = lots_snapshot()
+    # Idle streams can stay open for hours, so the generator keeps no
+    # request context; it opens an app context only when it must query.
+    app = current_app._get_current_object()
+
+    def generate():
+        with subscription:
+            yield "retry: 5000\n\n"
+            yield sse('snapshot', snapshot)
+            while True:
+                events, dropped = subscription.get(STREAM_HEARTBEAT_SECONDS)
+                if dropped:
+                    # This client fell behind and lost deltas; start it over.
+                    with app.app_context():
+                        g.read_only = True
+                        yield sse('snapshot', lots_snapshot())
+                    continue
+                if not events:
+                    yield ": heartbeat\n\n"
+                for event, data in events:
+                    yield sse(event, data)
+
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Also unsubscribe if the client goes away before the stream starts.
+    response.call_on_close(subscription.close)
+    return response
+
+
+@api_bp.route('/lots/search', methods=['GET'])
+def search_lots():
+    term = request.args.get('q', '').strip()
+    limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+    if not term:
+        return error_response("Query parameter 'q' is required.", 400)
+    if limit < 1 or limit > MAX_SEARCH_LIMIT:
+        return error_response(f"'limit' must be between 1 and {MAX_SEARCH_LIMIT}.", 400)
+
+    matches = lot_search.search(term, limit)
+    available = dict(
+        db.session.query(ParkingLot.id, ParkingLot.available)
+        .filter(ParkingLot.id.in_([match.id for match in matches]))
+        .all()
+    ) if matches else {}
+
+    data = []
+    for match in matches:
+        data.append({
+            'id': match.id,
+            'prime_location_name': match.name,
+            'address': match.address,
+            'pin_code': match.pin_code,
+            'city': {
+                'name': match.city,
+                'state': match.state
+            },
+            'available_spots': available.get(match.id, 0)
         })
-    return jsonify({'lots': data}), 200
+    return jsonify({'query': term, 'lots': data}), 200
 
 
 @api_bp.route('/lots/<int:lot_id>/spots', methods=['GET'])
 def get_spots(lot_id):
-    lot = ParkingLot.query.get(lot_id)
-    if not lot:
-        return error_response(f"Parking lot with ID {lot_id} not found.", 404)
+    etag = f"lot-{lot_id}-{DataVersion.current(DataVersion.LOTS)}"
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    if not lot.spots:
+    spots = (
+        db.session.query(
+            ParkingSpot.id,
+            ParkingSpot.status,
+            ParkingSpot.created_at,
+            ParkingLot.prime_location_name,
+            Reservation.id.label('reservation_id')
+        )
+        .join(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
+        .outerjoin(Reservation, db.and_(
+            Reservation.spot_id == ParkingSpot.id,
+            Reservation.is_active == True
+        ))
+        .filter(ParkingSpot.lot_id == lot_id)
+        .order_by(ParkingSpot.id)
+        .all()
+    )
+    if not spots:
+        if not db.session.get(ParkingLot, lot_id):
+            return error_response(f"Parking lot with ID {lot_id} not found.", 404)
         return error_response(f"No parking spots found in lot ID {lot_id}.", 404)
 
+    lot_name = spots[0].prime_location_name
     data = []
-    for spot in lot.spots:
+    for spot in spots:
         data.append({
             'id': spot.id,
-            'status': 'Occupied' if spot.is_occupied else 'Available',
-            'lot_id': lot.id,
-            'lot_name': lot.prime_location_name,
+            'status': 'Occupied' if spot.status == 'O' else 'Available',
+            'lot_id': lot_id,
+            'lot_name': lot_name,
             'created_at': spot.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'is_reserved': spot.reservation is not None
+            'is_reserved': spot.reservation_id is not None
         })
-    
-    return jsonify({
-        'lot_id': lot.id,
-        'lot_name': lot.prime_location_name,
-        'total_spots': len(lot.spots),
+
+    response = jsonify({
+        'lot_id': lot_id,
+        'lot_name': lot_name,
+        'total_spots': len(spots),
         'spots': data
-    }), 200
+    })
+    return with_etag(response, etag), 200
 
 
 
 @api_bp.route('/reservations', methods=['GET'])
 def get_all_reservations():
-    reservations = Reservation.query.all()
-    if not reservations:
+    try:
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor is not None else None
+    except ValueError:
+        return error_response("Invalid 'cursor'.", 400)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    try:
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        return error_response("'since' must be an ISO 8601 date or datetime.", 400)
+    lot_id = request.args.get('lot_id', type=int)
+    user_id = request.args.get('user_id', type=int)
+    stream = request.args.get('format') == 'ndjson'
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return error_response(f"'limit' must be between 1 and {MAX_PAGE_SIZE}.", 400)
+
+    # Archived reservations are merged in, so ids stay in one sequence.
+    sources = reservation_sources(ReservationFilters(lot_id=lot_id, user_id=user_id, since=since))
+
+    if stream:
+        # One JSON object per line, fetched in chunks, so memory stays flat
+        # however many rows match. 'limit' is ignored here.
+        def generate():
+            for row in merged_by_id(sources, cursor, STREAM_CHUNK_SIZE):
+                yield json.dumps(reservation_to_dict(row)) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    rows, next_cursor = keyset_page(
+        sources, 'id', False, None if cursor is None else str(cursor), limit
+    )
+    if not rows and cursor is None:
         return error_response("No reservations found.")
 
-    data = []
-    for res in reservations:
-        data.append({
-            'id': res.id,
-            'user_id': res.user_id,
-            'username': res.user.username,
-            'spot_id': res.spot_id,
-            'lot_id': res.spot.lot_id,
-            'lot_name': res.spot.lot.prime_location_name,
-            'vehicle_number': res.vehicle_number,
-            'is_active': res.is_active,
-            'parked_at': res.parking_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'left_at': res.leaving_timestamp.strftime('%Y-%m-%d %H:%M:%S') if res.leaving_timestamp else None,
-            'cost': res.parking_cost
-        })
-    return jsonify({'reservations': data}), 200
+    data = [reservation_to_dict(row) for row in rows]
+    next_cursor = int(next_cursor) if next_cursor else None
+    return jsonify({'reservations': data, 'next_cursor': next_cursor}), 200
+
+
+@api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """A background job's status, polled by whoever queued it."""
+    # Jobs are queued from the admin pages, and their results are reports.
+    if not current_user.is_authenticated or current_user.role != 'admin':
+        return error_response("Admin login required.", 403)
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return error_response(f"Job with ID {job_id} not found.")
+    return jsonify(job_to_dict(job)), 200
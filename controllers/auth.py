@@ -1,12 +1,48 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from flask_login import login_user, logout_user, login_required
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from flask_login import login_user, logout_user, login_required, current_user
 from models import db, User,Admin
-from flask_bcrypt import Bcrypt
+from identity import identity_cache, USER_TYPES
+from extensions import bcrypt
 from datetime import timedelta
 
-bcrypt = Bcrypt()
 auth_bp = Blueprint('auth', __name__)
 
+# Hashed once per work factor and checked against when the username is
+# unknown, so a failed login costs the same whether or not the account exists.
+_dummy_hashes = {}
+
+
+def find_account(username):
+    """(user_type, id, password_hash) for a username, or None.
+
+    One query over both tables. Admin accounts win if a username exists in
+    both, so a registered user can never shadow an administrator.
+    """
+    accounts = db.union_all(
+        db.select(db.literal('admin').label('user_type'), Admin.id, Admin.password_hash)
+        .where(Admin.username == username),
+        db.select(db.literal('user').label('user_type'), User.id, User.password_hash)
+        .where(User.username == username),
+    ).order_by(db.literal_column('user_type'))
+    return db.session.execute(accounts).first()
+
+
+def work_factor():
+    return current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+
+def dummy_hash():
+    rounds = work_factor()
+    if rounds not in _dummy_hashes:
+        _dummy_hashes[rounds] = bcrypt.generate_password_hash('not a password').decode('utf-8')
+    return _dummy_hashes[rounds]
+
+
+def hash_rounds(password_hash):
+    # bcrypt hashes look like $2b$12$<salt+hash>; the second field is the cost.
+    return int(password_hash.split('$')[2])
+
+
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
@@ -18,7 +54,7 @@ def register():
         password = request.form.get('password')
         confirm_password = request.form.get('confirm_password')
 
-        existing_username = User.query.filter_by(username=username).first()
+        existing_username = find_account(username)
         existing_email = User.query.filter_by(email=email).first()
 
         if existing_username:
@@ -60,21 +96,31 @@ def login():
         password = request.form['password']
         remember = 'remember' in request.form
 
-        user = User.query.filter_by(username=username).first()
-        admin = Admin.query.filter_by(username=username).first()
-        
-        if user and bcrypt.check_password_hash(user.password_hash, password):
-            session['user_type'] = 'user'
-            login_user(user, remember=remember, duration=timedelta(days=30))
+        account = find_account(username)
+        stored_hash = account.password_hash if account else dummy_hash()
+
+        # Exactly one bcrypt check per attempt, known user or not.
+        if bcrypt.check_password_hash(stored_hash, password) and account:
+            if hash_rounds(account.password_hash) != work_factor():
+                model = USER_TYPES[account.user_type]
+                model.query.filter_by(id=account.id).update(
+                    {model.password_hash: bcrypt.generate_password_hash(password).decode('utf-8')},
+                    synchronize_session=False
+                )
+                db.session.commit()
+
+            session['user_type'] = account.user_type
+            login_user(
+                identity_cache.load(account.user_type, account.id),
+                remember=remember,
+                duration=timedelta(days=30)
+            )
+            if account.user_type == 'admin':
+                flash('Admin login successful!')
+                return redirect(url_for('admin.dashboard'))
             flash('Login successful!')
             return redirect(url_for('user.dashboard'))
-        
-        if admin and bcrypt.check_password_hash(admin.password_hash, password):
-            session['user_type'] = 'admin'
-            login_user(admin, remember=remember, duration=timedelta(days=30))
-            flash('Admin login successful!')
-            return redirect(url_for('admin.dashboard'))
-        
+
         flash('Invalid username or password')
     
     return render_template('login.html')
@@ -83,6 +129,7 @@ def login():
 @auth_bp.route('/logout')
 @login_required
 def logout():
+    identity_cache.invalidate((current_user.user_type, current_user.id))
     logout_user()
     session.clear() 
     flash('Logged out successfully!')
@@ -1,13 +1,25 @@
-from flask import Blueprint, render_template,request,redirect,flash,url_for
+from flask import Blueprint, render_template,request,redirect,flash,url_for,jsonify
 from flask_login import login_required,current_user
-from decorators import user_required
-from math import ceil
-from models import db, ParkingLot, Reservation,ParkingSpot,City
+from cache import reference_cache
+import search as lot_search
+from decorators import user_required, read_only
+from allocator import claim_spot, free_spot
+from metrics import metrics
+from events import lot_events
+from pricing import elapsed_minutes, parking_cost, parking_costs
+from reports import keyset_page, user_reservation_sources, user_reservations_query
+from models import db, ParkingLot, Reservation,ParkingSpot,DataVersion,LotDailyStats,UserStats
 from datetime import datetime
-from sqlalchemy import or_
 
 user_bp = Blueprint('user', __name__, url_prefix='/user')
 
+# Active reservations shown on My Reservations; anything beyond is summarised.
+ACTIVE_RESERVATIONS_LISTED = 20
+# Completed reservations per page of My Reservations.
+COMPLETED_PAGE_SIZE = 24
+# Reservations per page of the history on the user summary.
+HISTORY_PAGE_SIZE = 20
+
 @user_bp.route('/dashboard', methods=['GET'])
 @login_required
 @user_required
@@ -16,26 +28,11 @@ def dashboard():
     state = request.args.get('state', '').strip().lower()
     city = request.args.get('city', '').strip().lower()
 
-    query = ParkingLot.query.join(City).filter(True)
+    lots = lot_search.filter_lots(search, state, city)
 
-    
-    if search:
-        query = query.filter(
-            or_(
-                ParkingLot.prime_location_name.ilike(f"%{search}%"),
-                ParkingLot.pin_code.ilike(f"%{search}%")
-            )
-        )
-    if state:
-        query = query.filter(City.state.ilike(f"%{state}%"))
-    if city:
-        query = query.filter(City.name.ilike(f"%{city}%"))
-
-    lots = query.all()
-
-    
-    states = [row[0] for row in db.session.query(City.state).distinct().all()]
-    cities = [row[0] for row in db.session.query(City.name).distinct().all()]
+    # Dropdown values come from the reference cache
+    states = reference_cache.states()
+    cities = reference_cache.city_names()
 
     return render_template(
         'user/dashboard.html',
@@ -79,24 +76,27 @@ def reserve_spot(lot_id):
         return redirect(url_for('user.dashboard'))
 
     
-    spot = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').first()
-    if not spot:
+    claim = claim_spot(lot.id)
+    if claim is None:
         flash("No available spots in this lot.", "danger")
         return redirect(url_for('user.dashboard'))
 
     
-    spot.status = 'O'
     reservation = Reservation(
-        spot_id=spot.id,
+        spot_id=claim.spot_id,
         user_id=current_user.id,
         vehicle_number=vehicle_number,
         parking_timestamp=datetime.utcnow(),
         is_active=True
     )
     db.session.add(reservation)
+    UserStats.reserved(current_user.id, lot.id)
+    DataVersion.bump(DataVersion.LOTS)
     db.session.commit()
+    metrics.reserved(lot.id)
+    lot_events.publish_occupancy(*claim.occupancy)
 
-    flash(f"Spot {spot.id} reserved successfully for vehicle {vehicle_number}.", "success")
+    flash(f"Spot {claim.spot_id} reserved successfully for vehicle {vehicle_number}.", "success")
     return redirect(url_for('user.dashboard'))
 
 @user_bp.route('/release/<int:reservation_id>', methods=['POST'])
@@ -116,144 +116,150 @@ def release_spot(reservation_id):
         flash("Unauthorized access.", "danger")
         return redirect(url_for('user.dashboard'))
 
-    
-    reservation.leaving_timestamp = datetime.utcnow()
-    reservation.spot.status = 'A'  
-    reservation.is_active = False  
+    if not reservation.is_active:
+        flash("This reservation has already been released.", "warning")
+        return redirect(url_for('user.my_reservations'))
 
     
-    duration = reservation.leaving_timestamp - reservation.parking_timestamp
-    minutes = duration.total_seconds() // 60
-    hourly_rate = reservation.spot.lot.price_per_hour
-
-    if minutes <= 60:
-        cost = hourly_rate
-    else:
-        per_minute_rate = hourly_rate / 60
-        cost = ceil(per_minute_rate * minutes)
-
-    reservation.parking_cost = cost
+    lot = reservation.spot.lot
+    left_at = datetime.utcnow()
+    minutes = elapsed_minutes(reservation.parking_timestamp, left_at)
+    cost = parking_cost(lot.price_per_hour, minutes)
+
+    # Only one of two overlapping releases ends the reservation; the other
+    # must not free the spot or count the stay again.
+    released = db.session.execute(
+        db.update(Reservation)
+        .where(Reservation.id == reservation.id, Reservation.is_active == True)
+        .values(is_active=False, leaving_timestamp=left_at, parking_cost=cost)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not released:
+        db.session.rollback()
+        flash("This reservation has already been released.", "warning")
+        return redirect(url_for('user.my_reservations'))
+
+    occupancy = free_spot(reservation.spot_id)
+    LotDailyStats.record(lot.id, left_at.date(), cost, minutes)
+    UserStats.released(reservation.user_id, lot.id, cost)
+    DataVersion.bump(DataVersion.LOTS)
 
     db.session.commit()
+    if occupancy is not None:
+        metrics.released(lot.id)
+        lot_events.publish_occupancy(*occupancy)
 
     flash("Spot released successfully!", "success")
     return redirect(url_for('user.my_reservations'))
 
+def format_duration(total_minutes):
+    return f"{total_minutes // 60} hour(s) {total_minutes % 60} minute(s)"
+
 @user_bp.route('/my-reservations')
 @login_required
 @user_required
 def my_reservations():
-    # Fetch active reservations
-    active_reservations = (
-        Reservation.query
-        .join(ParkingSpot)
-        .join(ParkingLot)
-        .filter(
-            Reservation.user_id == current_user.id,
-            Reservation.is_active == True,
-            Reservation.leaving_timestamp == None
-        )
+    # Active reservations, with a live cost priced in one batch
+    now = datetime.utcnow()
+    active = (
+        user_reservations_query(current_user.id, True, now)
         .order_by(Reservation.parking_timestamp.desc())
+        .limit(ACTIVE_RESERVATIONS_LISTED + 1)
         .all()
     )
+    more_active = len(active) > ACTIVE_RESERVATIONS_LISTED
+    active = active[:ACTIVE_RESERVATIONS_LISTED]
+    active_costs = parking_costs([res.price_per_hour for res in active], [res.minutes for res in active])
 
-    now = datetime.utcnow()
     active_data = []
-    for res in active_reservations:
-        duration = now - res.parking_timestamp
-        total_minutes = int(duration.total_seconds() // 60)
-        hours = total_minutes // 60
-        minutes = total_minutes % 60
-
-        price_per_hour = res.spot.lot.price_per_hour
-        if total_minutes <= 60:
-            cost = price_per_hour
-        else:
-            per_minute_rate = price_per_hour / 60
-            cost = ceil(total_minutes * per_minute_rate)
-
-        duration_str = f"{hours} hour(s) {minutes} minute(s)"
+    for res, cost in zip(active, active_costs):
         active_data.append({
             'reservation': res,
-            'duration_str': duration_str,
-            'final_cost': cost
+            'duration_str': format_duration(res.minutes),
+            'final_cost': cost.item()
         })
 
-    # Fetch completed reservations
-    completed_reservations = (
-        Reservation.query
-        .filter_by(user_id=current_user.id, is_active=False)
-        .order_by(Reservation.leaving_timestamp.desc())
-        .all()
+    # First page of completed reservations; the rest is fetched as the user scrolls
+    completed, next_cursor = keyset_page(
+        user_reservation_sources(current_user.id, False), limit=COMPLETED_PAGE_SIZE
     )
-
-    completed_data = []
-    for res in completed_reservations:
-        if res.leaving_timestamp:
-            duration = res.leaving_timestamp - res.parking_timestamp
-            total_minutes = int(duration.total_seconds() // 60)
-            hours = total_minutes // 60
-            minutes = total_minutes % 60
-
-            price_per_hour = res.spot.lot.price_per_hour
-            if total_minutes <= 60:
-                cost = price_per_hour
-            else:
-                per_minute_rate = price_per_hour / 60
-                cost = ceil(total_minutes * per_minute_rate)
-
-            duration_str = f"{hours} hour(s) {minutes} minute(s)"
-            completed_data.append({
-                'reservation': res,
-                'duration_str': duration_str,
-                'final_cost': cost
-            })
+    completed_data = [completed_to_dict(res) for res in completed]
 
     return render_template(
         'user/my_reservations.html',
         active_data=active_data,
+        more_active=more_active,
         completed_data=completed_data,
-        current_time=datetime.utcnow()
+        next_cursor=next_cursor,
+        current_time=now
     )
 
+@user_bp.route('/my-reservations/completed')
+@login_required
+@user_required
+def completed_reservations():
+    """Next page of completed reservations, as JSON, for infinite scroll."""
+    try:
+        completed, next_cursor = keyset_page(
+            user_reservation_sources(current_user.id, False),
+            cursor=request.args.get('cursor'),
+            limit=COMPLETED_PAGE_SIZE
+        )
+    except ValueError:
+        return jsonify({'error': "Invalid 'cursor'."}), 400
+    return jsonify({
+        'reservations': [completed_to_dict(res) for res in completed],
+        'next_cursor': next_cursor
+    })
+
+def completed_to_dict(res):
+    return {
+        'id': res.id,
+        'lot_name': res.prime_location_name,
+        'city': res.city_name,
+        'state': res.city_state,
+        'spot_id': res.spot_id,
+        'vehicle_number': res.vehicle_number,
+        'parked_at': res.parking_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'left_at': res.leaving_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'price_per_hour': res.price_per_hour,
+        'duration_str': format_duration(res.minutes),
+        'cost': res.parking_cost
+    }
+
 @user_bp.route('/summary')
 @login_required
 @user_required
+@read_only
 def summary():
-    reservations = (
-        Reservation.query
-        .filter_by(user_id=current_user.id)
-        .order_by(Reservation.parking_timestamp.desc())
-        .all()
+    # Running totals per lot, kept up to date by reserve_spot and release_spot
+    stats = UserStats.query.filter_by(user_id=current_user.id).all()
+    total_reservations = sum(row.visits for row in stats)
+    active_reservations = sum(row.active for row in stats)
+    total_spent = sum(row.spent for row in stats)
+
+    lots = reference_cache.lots()
+    spending = sorted(
+        (lots[row.lot_id].prime_location_name, round(row.spent, 2))
+        for row in stats if row.lot_id in lots and row.visits > row.active
     )
-
-    total_reservations = len(reservations)
-    active_reservations = sum(1 for r in reservations if r.is_active)
-
-    
-    total_spent = sum(r.parking_cost for r in reservations if r.leaving_timestamp and r.parking_cost)
-
-    
-    from sqlalchemy import func
-    lot_revenue_data = (
-        db.session.query(
-            ParkingLot.prime_location_name,
-            func.sum(Reservation.parking_cost)
+    lot_names = [name for name, _ in spending]
+    lot_revenues = [spent for _, spent in spending]
+
+    # One page of history, newest first
+    cursor = request.args.get('cursor')
+    try:
+        reservations, next_cursor = keyset_page(
+            user_reservation_sources(current_user.id), cursor=cursor, limit=HISTORY_PAGE_SIZE
         )
-        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
-        .join(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
-        .filter(Reservation.user_id == current_user.id)
-        .filter(Reservation.is_active == False)
-        .group_by(ParkingLot.prime_location_name)
-        .all()
-    )
-
-    lot_names = [lot for lot, _ in lot_revenue_data]
-    lot_revenues = [round(revenue or 0, 2) for _, revenue in lot_revenue_data]
+    except ValueError:
+        return redirect(url_for('user.summary'))
 
     return render_template(
         'user/summary.html',
         reservations=reservations,
+        cursor=cursor,
+        next_cursor=next_cursor,
         total_reservations=total_reservations,
         active_reservations=active_reservations,
         total_spent=total_spent,
@@ -0,0 +1,217 @@
+import sqlite3
+import sys
+import threading
+
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Connection settings for SQLite. WAL lets readers run while a writer
+# commits; synchronous=NORMAL is durable across application crashes in WAL
+# mode and skips an fsync per commit; the busy timeout makes a writer wait
+# for the lock instead of failing with "database is locked". Set any of
+# these to None in the app config to leave SQLite's default in place.
+SQLITE_DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_BUSY_TIMEOUT': 5000,  # milliseconds
+    'SQLITE_CACHE_SIZE': -20000,  # negative means KiB, i.e. ~20 MB per connection
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+}
+
+POOL_DEFAULTS = {
+    'DB_POOL_SIZE': 10,
+    'DB_MAX_OVERFLOW': 20,
+    'DB_POOL_TIMEOUT': 30,
+    # Read-only views (see decorators.read_only) can run on a pool of their
+    # own, so long reports never hold connections the write path needs.
+    'DB_READ_POOL': True,
+    'DB_READ_POOL_SIZE': 5,
+    'DB_READ_MAX_OVERFLOW': 10,
+    'DB_READ_DATABASE_URI': None,  # defaults to the primary database
+    # Under gevent (gunicorn.conf.py), step SQLite on gevent's threadpool;
+    # see CooperativeConnection. Ignored unless gevent has patched the process.
+    'DB_GEVENT_THREADPOOL': True,
+}
+
+PRAGMAS = (
+    ('journal_mode', 'SQLITE_JOURNAL_MODE'),
+    ('synchronous', 'SQLITE_SYNCHRONOUS'),
+    ('busy_timeout', 'SQLITE_BUSY_TIMEOUT'),
+    ('cache_size', 'SQLITE_CACHE_SIZE'),
+    ('mmap_size', 'SQLITE_MMAP_SIZE'),
+)
+
+
+class _Store:
+    def __init__(self, pragmas):
+        self.pragmas = pragmas
+        self.lock = threading.Lock()
+        self.read_engine = None
+        self.read_engine_checked = False
+
+
+class Database:
+    """Connection tuning and the read-only connection pool.
+
+    init_app() must run before db.init_app() so the pool options reach the
+    primary engine. Pragmas are applied to every new SQLite connection made
+    while an app context is active, on both pools.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in {**SQLITE_DEFAULTS, **POOL_DEFAULTS}.items():
+            app.config.setdefault(key, value)
+
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        if _is_file_sqlite(uri):
+            options.setdefault('pool_size', app.config['DB_POOL_SIZE'])
+            options.setdefault('max_overflow', app.config['DB_MAX_OVERFLOW'])
+            options.setdefault('pool_timeout', app.config['DB_POOL_TIMEOUT'])
+            if _cooperative(app.config):
+                options.setdefault('connect_args', {}).setdefault('factory', CooperativeConnection)
+                # A thread for every connection of both pools: a statement
+                # queued behind threads waiting for a lock its own
+                # connection holds would wait out their busy timeout.
+                connections = app.config['DB_POOL_SIZE'] + app.config['DB_MAX_OVERFLOW']
+                connections += app.config['DB_READ_POOL_SIZE'] + app.config['DB_READ_MAX_OVERFLOW']
+                CooperativeConnection.threadpool_size = max(CooperativeConnection.threadpool_size, connections)
+
+        pragmas = [
+            (pragma, app.config[key]) for pragma, key in PRAGMAS
+            if app.config[key] is not None
+        ]
+        app.extensions['database'] = _Store(pragmas)
+
+    @property
+    def _store(self):
+        return current_app.extensions['database']
+
+    def read_engine(self):
+        """The read-only engine, or None when reads should use the primary."""
+        store = self._store
+        with store.lock:
+            if not store.read_engine_checked:
+                store.read_engine = self._make_read_engine()
+                store.read_engine_checked = True
+            return store.read_engine
+
+    def _make_read_engine(self):
+        config = current_app.config
+        if not config['DB_READ_POOL']:
+            return None
+        url = config['DB_READ_DATABASE_URI'] or current_app.extensions['sqlalchemy'].engine.url
+        if not _is_file_sqlite(str(url)):
+            return None
+        engine = sa.create_engine(
+            url,
+            pool_size=config['DB_READ_POOL_SIZE'],
+            max_overflow=config['DB_READ_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            connect_args={'factory': CooperativeConnection} if _cooperative(config) else {},
+        )
+        event.listen(engine, 'connect', _make_query_only)
+        return engine
+
+    def dispose(self, close=True):
+        """Drop the read engine's pooled connections. Pass close=False in
+        a forked child so the parent's connections are left alone."""
+        store = self._store
+        with store.lock:
+            if store.read_engine is not None:
+                store.read_engine.dispose(close=close)
+            store.read_engine = None
+            store.read_engine_checked = False
+
+
+database = Database()
+
+
+class RoutingSession(Session):
+    """Sends the queries of read-only views to the read pool."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get('read_only'):
+            engine = database.read_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class CooperativeConnection(sqlite3.Connection):
+    """A sqlite3 connection for gevent workers.
+
+    sqlite3 runs in C without yielding to the gevent hub, so a statement
+    waiting out SQLITE_BUSY_TIMEOUT, or a long report, would freeze every
+    greenlet of the worker, open streams included. This connection runs
+    each call that steps SQLite (execute, fetch, commit, rollback) on the
+    hub's threadpool instead, and only the calling greenlet waits.
+    """
+    threadpool_size = 10
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or CooperativeCursor)
+
+    def commit(self):
+        return _threadpool().apply(super().commit)
+
+    def rollback(self):
+        return _threadpool().apply(super().rollback)
+
+
+class CooperativeCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        return _threadpool().apply(super().execute, args)
+
+    def executemany(self, *args):
+        return _threadpool().apply(super().executemany, args)
+
+    def fetchone(self):
+        return _threadpool().apply(super().fetchone)
+
+    def fetchmany(self, *args):
+        return _threadpool().apply(super().fetchmany, args)
+
+    def fetchall(self):
+        return _threadpool().apply(super().fetchall)
+
+
+def _threadpool():
+    from gevent import get_hub
+    threadpool = get_hub().threadpool
+    if threadpool.maxsize < CooperativeConnection.threadpool_size:
+        threadpool.maxsize = CooperativeConnection.threadpool_size
+    return threadpool
+
+
+def _cooperative(config):
+    """Whether to use CooperativeConnection: gevent has patched the
+    standard library and DB_GEVENT_THREADPOOL is on."""
+    monkey = sys.modules.get('gevent.monkey')
+    return bool(config['DB_GEVENT_THREADPOOL']) and monkey is not None and monkey.is_module_patched('socket')
+
+
+def _is_file_sqlite(uri):
+    return uri.startswith('sqlite') and ':memory:' not in uri and uri not in ('sqlite://', 'sqlite:///')
+
+
+def _make_query_only(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA query_only = ON')
+
+
+@event.listens_for(Engine, 'connect')
+def _apply_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection) or not has_app_context():
+        return
+    store = current_app.extensions.get('database')
+    if store is None:
+        return
+    for pragma, value in store.pragmas:
+        dbapi_connection.execute(f'PRAGMA {pragma} = {value}')
@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import redirect, url_for, flash
+from flask import redirect, url_for, flash, g
 from flask_login import current_user
 
 def admin_required(f):
@@ -25,3 +25,11 @@ def user_required(f):
             return redirect(url_for('admin.dashboard'))  # Redirect to admin dashboard
         return f(*args, **kwargs)
     return decorated_function
+
+def read_only(f):
+    """Run the view's queries on the read-only connection pool (see database.py)."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+    return decorated_function
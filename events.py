@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import deque
+
+from flask import current_app, g
+
+from models import db, DataVersion, ParkingLot
+
+# Event names sent to subscribers.
+LOT = 'lot'                # data: {'lot_id', 'available', 'occupied'}
+LOT_REMOVED = 'lot-removed'  # data: {'lot_id'}
+
+
+class Subscription:
+    """One subscriber's bounded queue. When it overflows the oldest events
+    are dropped and the next get() reports how many were lost."""
+
+    def __init__(self, hub_store, size):
+        self._hub_store = hub_store
+        self._events = deque(maxlen=size)
+        self._ready = threading.Condition(threading.Lock())
+        self._dropped = 0
+
+    def put(self, event):
+        with self._ready:
+            if len(self._events) == self._events.maxlen:
+                self._dropped += 1
+            self._events.append(event)
+            self._ready.notify()
+
+    def get(self, timeout):
+        """Wait up to `timeout` seconds; returns (events, dropped)."""
+        with self._ready:
+            if not self._events:
+                self._ready.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            dropped, self._dropped = self._dropped, 0
+            return events, dropped
+
+    def close(self):
+        with self._hub_store.lock:
+            self._hub_store.subscribers.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _Store:
+    def __init__(self, queue_size, poll_interval):
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.subscribers = set()
+        # Published events not yet fanned out to the subscribers.
+        self.outbox = []
+        # Last counters sent per lot, so the watcher only sends real changes.
+        self.known = {}
+        self.thread = None
+
+
+class EventHub:
+    """In-process publish/subscribe for live lot occupancy.
+
+    Views publish after they commit. publish() only appends to an outbox;
+    a hub thread, running while anyone is subscribed, copies each event
+    into every subscriber's bounded queue, so the publishing request does
+    not pay for thousands of idle subscribers. The same thread picks up
+    writes handled by other worker processes: every EVENTS_POLL_INTERVAL
+    seconds it checks the lots DataVersion and publishes the counters that
+    changed.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EVENTS_QUEUE_SIZE', 100)
+        app.config.setdefault('EVENTS_POLL_INTERVAL', 2.0)
+        app.extensions['events'] = _Store(
+            app.config['EVENTS_QUEUE_SIZE'],
+            app.config['EVENTS_POLL_INTERVAL']
+        )
+
+    @property
+    def _store(self):
+        return current_app.extensions['events']
+
+    def subscribe(self):
+        store = self._store
+        subscription = Subscription(store, store.queue_size)
+        with store.lock:
+            store.subscribers.add(subscription)
+            if store.thread is None:
+                store.thread = threading.Thread(
+                    target=self._run,
+                    args=(current_app._get_current_object(),),
+                    name='lot-events',
+                    daemon=True
+                )
+                store.thread.start()
+        return subscription
+
+    def subscriber_count(self):
+        store = self._store
+        with store.lock:
+            return len(store.subscribers)
+
+    def publish(self, name, data):
+        store = self._store
+        with store.lock:
+            if store.subscribers:
+                store.outbox.append((name, data))
+                store.wakeup.notify()
+
+    def publish_occupancy(self, lot_id, occupied, available):
+        """Publish a lot's committed counters, e.g. an allocator.Occupancy."""
+        store = self._store
+        with store.lock:
+            store.known[lot_id] = (occupied, available)
+        self.publish(LOT, {'lot_id': lot_id, 'available': available, 'occupied': occupied})
+
+    def publish_removed(self, lot_id):
+        store = self._store
+        with store.lock:
+            store.known.pop(lot_id, None)
+        self.publish(LOT_REMOVED, {'lot_id': lot_id})
+
+    def _run(self, app):
+        with app.app_context():
+            store = self._store
+            try:
+                self._serve(store)
+            finally:
+                # _serve clears it when it stops; this is for when it fails.
+                # A newer thread may already be running by then.
+                with store.lock:
+                    if store.thread is threading.current_thread():
+                        store.thread = None
+
+    def _serve(self, store):
+        g.read_only = True
+        version = DataVersion.current(DataVersion.LOTS)
+        latest = lot_counters()
+        db.session.close()
+        with store.lock:
+            store.known = latest
+        next_poll = time.monotonic() + store.poll_interval
+
+        while True:
+            with store.lock:
+                if not store.outbox:
+                    store.wakeup.wait(max(0, next_poll - time.monotonic()))
+                if not store.subscribers:
+                    # Cleared under the same lock as the check, so a
+                    # subscribe() from now on starts a new thread.
+                    store.outbox.clear()
+                    store.thread = None
+                    return
+                events, store.outbox = store.outbox, []
+                subscribers = list(store.subscribers)
+
+            for event in events:
+                for subscription in subscribers:
+                    subscription.put(event)
+
+            if time.monotonic() >= next_poll:
+                current = DataVersion.current(DataVersion.LOTS)
+                if current != version:
+                    version = current
+                    self._publish_changes(lot_counters())
+                db.session.close()
+                next_poll = time.monotonic() + store.poll_interval
+
+    def _publish_changes(self, latest):
+        store = self._store
+        with store.lock:
+            known = dict(store.known)
+        for lot_id, (occupied, available) in latest.items():
+            if known.get(lot_id) != (occupied, available):
+                self.publish_occupancy(lot_id, occupied, available)
+        for lot_id in known.keys() - latest.keys():
+            self.publish_removed(lot_id)
+
+
+lot_events = EventHub()
+
+
+def lot_counters():
+    """Current (occupied, available) of every lot, keyed by lot id."""
+    return {
+        lot_id: (occupied, available)
+        for lot_id, occupied, available in db.session.query(
+            ParkingLot.id, ParkingLot.occupied, ParkingLot.available
+        )
+    }
@@ -0,0 +1,55 @@
+"""CSV and XLSX writers for the admin exports.
+
+Both take a header and an iterable of row tuples and never hold more
+than a chunk of rows in memory.
+"""
+import csv
+import io
+import tempfile
+from datetime import date, datetime
+
+# Rows written to the buffer before each CSV chunk is sent.
+CSV_CHUNK_ROWS = 1000
+
+
+def csv_chunks(header, rows):
+    """Yield the CSV text of header and rows, CSV_CHUNK_ROWS rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(tuple(csv_value(value) for value in row))
+        if count % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def csv_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def xlsx_file(title, header, rows, output=None):
+    """Write an XLSX workbook to `output`, a binary file, and return it, rewound.
+
+    openpyxl's write-only mode streams each row to disk as it is appended.
+    Without `output` an anonymous temporary file is used, removed when
+    closed.
+    """
+    from openpyxl import Workbook  # slow to import; only Excel exports need it
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+
+    if output is None:
+        output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
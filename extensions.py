@@ -0,0 +1,19 @@
+"""Extension instances, created unbound and attached to each app by
+app.create_app(), so importing a module never needs an application."""
+from flask import session
+from flask_bcrypt import Bcrypt
+from flask_cors import CORS
+from flask_login import LoginManager
+
+from identity import identity_cache
+
+bcrypt = Bcrypt()
+cors = CORS()
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    # A cached snapshot, not an ORM instance; see identity.py.
+    return identity_cache.load(session.get('user_type'), int(user_id))
@@ -0,0 +1,67 @@
+"""Gunicorn settings for production:app.
+
+The app is built once in the master (preload_app) and forked into every
+worker, so workers start without importing anything and share the
+parent's memory pages until they write to them. Connection pools are
+reset after the fork; a worker never touches a connection opened by the
+master or by another worker.
+
+Workers are gevent workers: every user dashboard keeps /api/lots/stream
+open, and an idle stream costs a greenlet rather than a thread, so one
+worker holds thousands of them while still serving other requests.
+SQLite calls run on gevent's threadpool (database.CooperativeConnection),
+so a request waiting for the write lock holds up only itself.
+"""
+# Before anything else is imported: the app is preloaded in the master,
+# and the locks and threads it creates must be gevent's.
+from gevent import monkey
+monkey.patch_all()
+
+import importlib  # noqa: E402
+import multiprocessing  # noqa: E402
+import os  # noqa: E402
+import shutil  # noqa: E402
+import tempfile  # noqa: E402
+
+wsgi_app = 'production:app'
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gevent'
+# Open connections per worker, idle streams included.
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))
+preload_app = True
+accesslog = '-'
+
+# Imported by requests on first use. Loading them in the master, before
+# the fork, saves every worker the import on a live request.
+WARM_MODULES = ('numpy', 'openpyxl')
+
+# Each worker writes its metric values to files here and /metrics adds
+# them all up. Set before the app is loaded: prometheus_client reads it
+# on import.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'parking-metrics'))
+
+
+def on_starting(server):
+    # Totals start again from zero with the server, as they would in one process.
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+def when_ready(server):
+    for name in WARM_MODULES:
+        importlib.import_module(name)
+
+
+def post_fork(server, worker):
+    from production import app
+    from database import database
+    from jobs import job_runner
+    from models import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        database.dispose(close=False)
+        # Threads do not survive the fork; pick up jobs left queued by a restart.
+        job_runner.notify()
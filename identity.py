@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, DataVersion, User, Admin
+
+USER_TYPES = {'user': User, 'admin': Admin}
+
+# Columns that never leave the database row.
+PRIVATE_COLUMNS = {'password_hash'}
+
+
+class Identity(UserMixin):
+    """A read-only snapshot of a User or Admin row, safe to share across requests.
+
+    It carries the row's columns (minus the password hash) so views and
+    templates can use current_user.id, .role, .full_name and so on without
+    touching the database. It is not attached to any session.
+    """
+
+    def __init__(self, user_type, values):
+        self.user_type = user_type
+        self.__dict__.update(values)
+
+    @classmethod
+    def from_row(cls, user_type, row):
+        return cls(user_type, {
+            column.key: getattr(row, column.key)
+            for column in inspect(type(row)).column_attrs
+            if column.key not in PRIVATE_COLUMNS
+        })
+
+    def __repr__(self):
+        return f"<Identity {self.user_type} {self.id}>"
+
+
+class _Store:
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # DataVersion.IDENTITIES the entries were loaded under.
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+
+class IdentityCache:
+    """TTL + LRU cache of logged-in identities, keyed by (user type, id).
+
+    Entries are dropped as soon as a session in this process commits a
+    change to the User or Admin row. A change in any process also bumps
+    DataVersion.IDENTITIES in the same transaction, and each load compares
+    it with the version the cache was filled under (one primary-key read),
+    dropping every entry when it moved, so role changes and deleted
+    accounts take effect on the next request in every worker. Entries
+    also expire after IDENTITY_CACHE_TTL seconds. At most
+    IDENTITY_CACHE_SIZE identities are kept; the least recently used one
+    is evicted first.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IDENTITY_CACHE_TTL', 60)
+        app.config.setdefault('IDENTITY_CACHE_SIZE', 1024)
+        app.extensions['identity_cache'] = _Store(
+            app.config['IDENTITY_CACHE_TTL'],
+            app.config['IDENTITY_CACHE_SIZE']
+        )
+
+    @property
+    def _store(self):
+        return current_app.extensions['identity_cache']
+
+    def load(self, user_type, user_id):
+        """The Identity for a login session, or None if the account is gone."""
+        model = USER_TYPES.get(user_type)
+        if model is None:
+            return None
+        key = (user_type, user_id)
+        store = self._store
+        now = time.monotonic()
+        # Read before the row, so a row loaded here is never older than
+        # the version it is cached under.
+        version = DataVersion.current(DataVersion.IDENTITIES)
+        with store.lock:
+            if version != store.version:
+                store.entries.clear()
+                store.version = version
+            entry = store.entries.get(key)
+            if entry and entry[0] > now:
+                store.entries.move_to_end(key)
+                store.hits += 1
+                return entry[1]
+            store.misses += 1
+
+        row = db.session.get(model, user_id)
+        if row is None:
+            return None
+        identity = Identity.from_row(user_type, row)
+        with store.lock:
+            if store.version != version:
+                # Another request saw a newer version meanwhile; the row may be stale.
+                return identity
+            store.entries[key] = (now + store.ttl, identity)
+            store.entries.move_to_end(key)
+            while len(store.entries) > store.size:
+                store.entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, *keys):
+        store = self._store
+        with store.lock:
+            for key in keys:
+                store.entries.pop(key, None)
+
+    def stats(self):
+        store = self._store
+        with store.lock:
+            return {
+                'hits': store.hits,
+                'misses': store.misses,
+                'cached': len(store.entries),
+                'size': store.size
+            }
+
+
+identity_cache = IdentityCache()
+
+
+def _identity_key(obj):
+    for user_type, model in USER_TYPES.items():
+        if type(obj) is model and obj.id is not None:
+            return (user_type, obj.id)
+    return None
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_identities(session, flush_context):
+    changed = session.info.setdefault('changed_identities', set())
+    existing = False
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        key = _identity_key(obj)
+        if key is not None:
+            changed.add(key)
+            existing = existing or obj not in session.new
+    if existing:
+        # New accounts are in no cache; changed ones may be in any process's.
+        DataVersion.bump(DataVersion.IDENTITIES, session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_identities(session):
+    changed = session.info.pop('changed_identities', None)
+    if changed and has_app_context() and 'identity_cache' in current_app.extensions:
+        identity_cache.invalidate(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_identities(session):
+    session.info.pop('changed_identities', None)
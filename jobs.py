@@ -0,0 +1,255 @@
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app, g, url_for
+
+from models import db, DataVersion, Job, LotDailyStats, ParkingLot, UserStats
+from reports import EXPORTS, filters_from_params
+from exports import csv_chunks, xlsx_file
+
+# Job kind -> function(params) returning a JSON-safe result.
+HANDLERS = {}
+
+# Kinds an admin may queue from the jobs page, with their labels.
+MAINTENANCE_JOBS = {
+    'reconcile-counters': "Reconcile lot counters",
+    'rebill': "Re-bill completed reservations",
+    'backfill-daily-stats': "Rebuild daily lot statistics",
+    'backfill-user-stats': "Rebuild user totals",
+}
+
+
+def handler(kind):
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+class _Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.threads = set()
+        # Bumped by notify(), so a worker about to sleep or stop notices
+        # jobs queued while it was looking.
+        self.notified = 0
+
+
+class JobRunner:
+    """Runs the job table's queued work on worker threads.
+
+    Jobs are rows in `job`, so they survive restarts and any process can
+    queue them; workers claim one at a time with a single UPDATE, which
+    SQLite serialises, so no two workers run the same attempt. A claim is
+    a lease of JOBS_LEASE_SECONDS: if the worker dies, the job is claimed
+    again once the lease runs out. Failures are retried with exponential
+    backoff from JOBS_RETRY_DELAY until the job's max_attempts.
+
+    With JOBS_IN_PROCESS (the default) each web process starts up to
+    JOBS_WORKERS threads when notify() is called after a job is queued,
+    and they stop once nothing is queued. Set it to False to leave the
+    work to `flask run-jobs` instead.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_IN_PROCESS', True)
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+        app.config.setdefault('JOBS_LEASE_SECONDS', 900)
+        app.config.setdefault('JOBS_RETRY_DELAY', 30)
+        app.config.setdefault('JOBS_REPORT_DIR', os.path.join(app.instance_path, 'reports'))
+        app.extensions['jobs'] = _Store()
+
+    @property
+    def _store(self):
+        return current_app.extensions['jobs']
+
+    def notify(self):
+        """Wake this process's workers, starting them if needed. Call after
+        committing Job.enqueue()."""
+        app = current_app._get_current_object()
+        if not app.config['JOBS_IN_PROCESS']:
+            return
+        store = self._store
+        with store.lock:
+            store.notified += 1
+            store.wakeup.notify_all()
+            while len(store.threads) < app.config['JOBS_WORKERS']:
+                self._start(app, store, forever=False)
+
+    def run_forever(self, workers):
+        """Run `workers` threads that wait for jobs until interrupted."""
+        app = current_app._get_current_object()
+        store = self._store
+        with store.lock:
+            threads = [self._start(app, store, forever=True) for _ in range(workers)]
+        for thread in threads:
+            thread.join()
+
+    def _start(self, app, store, forever):
+        thread = threading.Thread(
+            target=self._work, args=(app, store, forever),
+            name=f'jobs-{len(store.threads) + 1}', daemon=True
+        )
+        store.threads.add(thread)
+        thread.start()
+        return thread
+
+    def _work(self, app, store, forever):
+        poll = app.config['JOBS_POLL_INTERVAL']
+        while True:
+            with store.lock:
+                notified = store.notified
+            try:
+                if self.run_next(app):
+                    continue
+                with app.app_context():
+                    delay = Job.seconds_until_due()
+            except Exception:
+                app.logger.exception("Job worker error")
+                delay = poll
+            with store.lock:
+                if store.notified != notified:
+                    continue
+                if delay is None and not forever:
+                    store.threads.discard(threading.current_thread())
+                    return
+                store.wakeup.wait(poll if delay is None else min(poll, delay))
+
+    def run_next(self, app):
+        """Claim and run one due job. Returns False if none was due."""
+        with app.app_context():
+            job = Job.claim(app.config['JOBS_LEASE_SECONDS'])
+            if job is None:
+                return False
+            run = HANDLERS.get(job.kind)
+            try:
+                if run is None:
+                    raise LookupError(f"No handler for job kind {job.kind!r}.")
+                result = run(job.params)
+            except Exception as exc:
+                db.session.rollback()
+                app.logger.exception("Job %s (%s) failed on attempt %s", job.id, job.kind, job.attempts)
+                retry_at = None
+                if run is not None and job.attempts < job.max_attempts:
+                    backoff = app.config['JOBS_RETRY_DELAY'] * 2 ** (job.attempts - 1)
+                    retry_at = datetime.utcnow() + timedelta(seconds=backoff)
+                outcome = {'error': f"{type(exc).__name__}: {exc}", 'retry_at': retry_at}
+            else:
+                outcome = {'result': result}
+            # The handler may have sent queries to the read pool; this is a write.
+            g.pop('read_only', None)
+            Job.finish(job.id, job.attempts, **outcome)
+            db.session.commit()
+            return True
+
+
+job_runner = JobRunner()
+
+
+def job_to_dict(job):
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        'error': job.error,
+        'created_at': timestamp(job.created_at),
+        'started_at': timestamp(job.started_at),
+        'finished_at': timestamp(job.finished_at),
+        'status_url': url_for('api.get_job', job_id=job.id),
+    }
+    if job.kind == 'export' and job.status == Job.SUCCEEDED:
+        data['download_url'] = url_for('admin.report_file', job_id=job.id)
+    return data
+
+
+def timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+def report_path(file_name):
+    return os.path.join(current_app.config['JOBS_REPORT_DIR'], file_name)
+
+
+def prune_jobs(before):
+    """Delete finished jobs older than `before` and their report files.
+    Returns the number of jobs deleted. The caller commits."""
+    finished = db.and_(Job.status.in_((Job.SUCCEEDED, Job.FAILED)), Job.finished_at < before)
+    for (result,) in db.session.query(Job.result).filter(finished, Job.kind == 'export'):
+        if result and os.path.exists(report_path(result['file'])):
+            os.remove(report_path(result['file']))
+    return db.session.execute(
+        db.delete(Job).where(finished).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+@handler('export')
+def export_report(params):
+    """Write an export to JOBS_REPORT_DIR, for admin.report_file to send."""
+    g.read_only = True
+    rows, header, stem = EXPORTS[params['name']]
+    fmt = params['fmt']
+    rows = rows(filters_from_params(params['filters']))
+
+    os.makedirs(current_app.config['JOBS_REPORT_DIR'], exist_ok=True)
+    file_name = f"{uuid.uuid4().hex}.{fmt}"
+    path = report_path(file_name)
+    # Written under another name first, so a half-written file is never served.
+    partial = f"{path}.part"
+    if fmt == 'csv':
+        with open(partial, 'w', newline='', encoding='utf-8') as output:
+            for chunk in csv_chunks(header, rows):
+                output.write(chunk)
+    else:
+        with open(partial, 'wb') as output:
+            xlsx_file(stem.capitalize(), header, rows, output)
+    os.replace(partial, path)
+
+    return {
+        'file': file_name,
+        'download_name': f"{stem}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}",
+        'bytes': os.path.getsize(path),
+    }
+
+
+@handler('reconcile-counters')
+def reconcile_counters(params):
+    lots = ParkingLot.reconcile_counters()
+    DataVersion.bump(DataVersion.LOTS)
+    db.session.commit()
+    return {'lots': lots}
+
+
+@handler('rebill')
+def rebill(params):
+    from pricing import rebill_reservations
+    repriced, changed = rebill_reservations()
+    if changed:
+        LotDailyStats.backfill()
+        UserStats.backfill()
+        db.session.commit()
+    return {'repriced': repriced, 'changed': changed}
+
+
+@handler('backfill-daily-stats')
+def backfill_daily_stats(params):
+    rows = LotDailyStats.backfill()
+    db.session.commit()
+    return {'rows': rows}
+
+
+@handler('backfill-user-stats')
+def backfill_user_stats(params):
+    rows = UserStats.backfill()
+    db.session.commit()
+    return {'rows': rows}
@@ -0,0 +1,117 @@
+import os
+import time
+
+from flask import Response, abort, current_app, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from models import db, ParkingLot
+
+# Request latency histogram bounds in seconds (Prometheus client defaults).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# This process's metrics. Under gunicorn, PROMETHEUS_MULTIPROC_DIR is set
+# and the counter and histogram values also go to per-worker files there,
+# which a scrape adds up instead.
+REGISTRY = CollectorRegistry()
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint and status.',
+    ('endpoint', 'method', 'status'), buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+RESERVATIONS = Counter(
+    'parking_reservations', 'Spots reserved per lot.', ('lot_id',), registry=REGISTRY
+)
+RELEASES = Counter(
+    'parking_releases', 'Spots released per lot.', ('lot_id',), registry=REGISTRY
+)
+
+
+class _OccupancyCollector:
+    """Occupied/available gauges per lot, read from the stored parking_lot
+    counters at scrape time. Every worker sees the same numbers this way,
+    for one query per scrape."""
+
+    def collect(self):
+        occupied = GaugeMetricFamily(
+            'parking_lot_occupied_spots', 'Occupied spots per lot.', labels=('lot_id',)
+        )
+        available = GaugeMetricFamily(
+            'parking_lot_available_spots', 'Free spots per lot.', labels=('lot_id',)
+        )
+        lots = db.session.query(ParkingLot.id, ParkingLot.occupied, ParkingLot.available).order_by(ParkingLot.id)
+        for lot_id, lot_occupied, lot_available in lots:
+            occupied.add_metric((str(lot_id),), lot_occupied)
+            available.add_metric((str(lot_id),), lot_available)
+        yield occupied
+        yield available
+
+
+OCCUPANCY = _OccupancyCollector()
+REGISTRY.register(OCCUPANCY)
+
+
+class Metrics:
+    """Prometheus metrics, built on prometheus_client.
+
+    Request latency is observed in request hooks and the reserve/release
+    paths count per lot. Under a preforking server, set
+    PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does) so each scrape adds
+    up the counters of every worker rather than reporting whichever worker
+    answered; the occupancy gauges come from the database either way.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.before_request(_start_timer)
+        app.after_request(_observe_request)
+        app.add_url_rule('/metrics', 'metrics', _metrics_view)
+
+    def observe_request(self, endpoint, method, status, seconds):
+        REQUEST_LATENCY.labels(endpoint, method, str(status)).observe(seconds)
+
+    def reserved(self, lot_id):
+        RESERVATIONS.labels(str(lot_id)).inc()
+
+    def released(self, lot_id):
+        RELEASES.labels(str(lot_id)).inc()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        registry = REGISTRY
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            MultiProcessCollector(registry)
+            registry.register(OCCUPANCY)
+        return generate_latest(registry)
+
+
+metrics = Metrics()
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        metrics.observe_request(
+            request.endpoint or 'unmatched',
+            request.method,
+            response.status_code,
+            time.perf_counter() - started
+        )
+    return response
+
+
+def _metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    return Response(metrics.render(), content_type=CONTENT_TYPE_LATEST)
@@ -5,6 +5,8 @@ from flask import current_app
 
 from alembic import context
 
+from search import FTS_TABLE_PREFIXES
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -90,9 +92,17 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # the FTS5 search indexes (and their shadow tables) are managed by hand
+    def include_name(name, type_, parent_names):
+        if type_ == 'table':
+            return not name.startswith(FTS_TABLE_PREFIXES)
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
 
     connectable = get_engine()
 
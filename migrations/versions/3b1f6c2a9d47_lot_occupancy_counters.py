@@ -0,0 +1,37 @@
+"""add occupancy counters to parking_lot
+
+Revision ID: 3b1f6c2a9d47
+Revises: ea954ff948a3
+Create Date: 2026-10-18 09:12:04.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b1f6c2a9d47'
+down_revision = 'ea954ff948a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('occupied', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('available', sa.Integer(), server_default='0', nullable=False))
+
+    # Seed the counters from the spots that already exist.
+    op.execute(
+        "UPDATE parking_lot SET "
+        "occupied = (SELECT COUNT(*) FROM parking_spot "
+        "WHERE parking_spot.lot_id = parking_lot.id AND parking_spot.status = 'O'), "
+        "available = (SELECT COUNT(*) FROM parking_spot "
+        "WHERE parking_spot.lot_id = parking_lot.id AND parking_spot.status = 'A')"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.drop_column('available')
+        batch_op.drop_column('occupied')
@@ -0,0 +1,35 @@
+"""make reservation ids autoincrement
+
+Revision ID: 3d8f2a6c1b97
+Revises: 9f1e6b3d7a52
+Create Date: 2026-10-19 09:20:41.663018
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3d8f2a6c1b97'
+down_revision = '9f1e6b3d7a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reservation', schema=None, recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}):
+        pass
+
+    # Start above every id in use, archived ones included.
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'reservation'")
+    op.execute(
+        "INSERT INTO sqlite_sequence (name, seq) "
+        "SELECT 'reservation', coalesce(max(id), 0) FROM ("
+        "SELECT id FROM reservation UNION ALL SELECT id FROM reservation_archive)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None, recreate='always',
+                              table_kwargs={'sqlite_autoincrement': False}):
+        pass
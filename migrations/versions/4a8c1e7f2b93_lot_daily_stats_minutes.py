@@ -0,0 +1,45 @@
+"""recompute lot_daily_stats with whole-minute durations
+
+Revision ID: 4a8c1e7f2b93
+Revises: 7c5e9b2d4f18
+Create Date: 2026-10-19 11:24:06.519370
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4a8c1e7f2b93'
+down_revision = '7c5e9b2d4f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # d41f7a9c2e58 filled occupied_minutes from julianday() * 1440, which
+    # floating point error can put a minute short of what release_spot
+    # records. Same rollup as LotDailyStats.backfill(), archived stays
+    # included.
+    op.execute("DELETE FROM lot_daily_stats")
+    op.execute(
+        "INSERT INTO lot_daily_stats (lot_id, day, revenue, sessions, occupied_minutes) "
+        "SELECT lot_id, date(leaving_timestamp), "
+        "coalesce(sum(parking_cost), 0), count(*), "
+        "coalesce(sum(CAST(round((julianday(leaving_timestamp) "
+        "- julianday(parking_timestamp)) * 86400000) AS INTEGER) / 60000), 0) "
+        "FROM ("
+        "SELECT parking_spot.lot_id, reservation.parking_timestamp, "
+        "reservation.leaving_timestamp, reservation.parking_cost "
+        "FROM reservation JOIN parking_spot ON parking_spot.id = reservation.spot_id "
+        "WHERE reservation.is_active = 0 AND reservation.leaving_timestamp IS NOT NULL "
+        "UNION ALL "
+        "SELECT lot_id, parking_timestamp, leaving_timestamp, parking_cost "
+        "FROM reservation_archive"
+        ") "
+        "GROUP BY lot_id, date(leaving_timestamp)"
+    )
+
+
+def downgrade():
+    # Only data changed; the recomputed rows are correct for older code too.
+    pass
@@ -0,0 +1,28 @@
+"""add data_version table for ETags
+
+Revision ID: 5e9a1c3f7b26
+Revises: 8c4e2d7b5a10
+Create Date: 2026-10-18 11:20:48.302115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e9a1c3f7b26'
+down_revision = '8c4e2d7b5a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('data_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('data_version')
@@ -0,0 +1,59 @@
+"""replace the user prefix indexes with a full-text index
+
+Revision ID: 7c5e9b2d4f18
+Revises: 3d8f2a6c1b97
+Create Date: 2026-10-19 10:02:17.384205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c5e9b2d4f18'
+down_revision = '3d8f2a6c1b97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE user_search USING fts5("
+        "username, email, full_name, content = 'user', content_rowid = 'id', "
+        "tokenize = 'unicode61', prefix = '2 3 4')"
+    )
+    op.execute(
+        "CREATE TRIGGER user_search_insert AFTER INSERT ON user BEGIN "
+        "INSERT INTO user_search (rowid, username, email, full_name) "
+        "VALUES (new.id, new.username, new.email, new.full_name); END"
+    )
+    op.execute(
+        "CREATE TRIGGER user_search_delete AFTER DELETE ON user BEGIN "
+        "INSERT INTO user_search (user_search, rowid, username, email, full_name) "
+        "VALUES ('delete', old.id, old.username, old.email, old.full_name); END"
+    )
+    op.execute(
+        "CREATE TRIGGER user_search_update AFTER UPDATE OF username, email, full_name ON user BEGIN "
+        "INSERT INTO user_search (user_search, rowid, username, email, full_name) "
+        "VALUES ('delete', old.id, old.username, old.email, old.full_name); "
+        "INSERT INTO user_search (rowid, username, email, full_name) "
+        "VALUES (new.id, new.username, new.email, new.full_name); END"
+    )
+    op.execute("INSERT INTO user_search (user_search) VALUES ('rebuild')")
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_full_name_lower')
+        batch_op.drop_index('ix_user_email_lower')
+        batch_op.drop_index('ix_user_username_lower')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_username_lower', [sa.text('lower(username)')], unique=False)
+        batch_op.create_index('ix_user_email_lower', [sa.text('lower(email)')], unique=False)
+        batch_op.create_index('ix_user_full_name_lower', [sa.text('lower(full_name)')], unique=False)
+
+    op.execute("DROP TRIGGER user_search_update")
+    op.execute("DROP TRIGGER user_search_delete")
+    op.execute("DROP TRIGGER user_search_insert")
+    op.execute("DROP TABLE user_search")
@@ -0,0 +1,42 @@
+"""add indexes for the hot query paths
+
+Revision ID: 8c4e2d7b5a10
+Revises: 3b1f6c2a9d47
+Create Date: 2026-10-18 10:02:37.540917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e2d7b5a10'
+down_revision = '3b1f6c2a9d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.create_index('ix_parking_lot_city_id', ['city_id'], unique=False)
+
+    with op.batch_alter_table('parking_spot', schema=None) as batch_op:
+        batch_op.create_index('ix_parking_spot_lot_id_status', ['lot_id', 'status'], unique=False)
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_user_id_is_active', ['user_id', 'is_active', 'parking_timestamp'], unique=False)
+        batch_op.create_index('ix_reservation_spot_id_is_active', ['spot_id', 'is_active'], unique=False)
+        batch_op.create_index('ix_reservation_parking_timestamp', ['parking_timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_parking_timestamp')
+        batch_op.drop_index('ix_reservation_spot_id_is_active')
+        batch_op.drop_index('ix_reservation_user_id_is_active')
+
+    with op.batch_alter_table('parking_spot', schema=None) as batch_op:
+        batch_op.drop_index('ix_parking_spot_lot_id_status')
+
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.drop_index('ix_parking_lot_city_id')
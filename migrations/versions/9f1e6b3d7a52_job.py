@@ -0,0 +1,47 @@
+"""add job
+
+Revision ID: 9f1e6b3d7a52
+Revises: e5a70c4b9d16
+Create Date: 2026-10-18 18:12:05.481936
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f1e6b3d7a52'
+down_revision = 'e5a70c4b9d16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('params', sa.JSON(), nullable=False),
+    sa.Column('dedupe_key', sa.String(length=100), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.create_index('ix_job_status_run_after', ['status', 'run_after'], unique=False)
+        batch_op.create_index('uq_job_dedupe_key_pending', ['dedupe_key'], unique=True,
+                              sqlite_where=sa.text("status IN ('queued', 'running')"))
+
+
+def downgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_index('uq_job_dedupe_key_pending')
+        batch_op.drop_index('ix_job_status_run_after')
+
+    op.drop_table('job')
@@ -0,0 +1,34 @@
+"""add full-text search index over parking lots
+
+Revision ID: a7d3f0b8c912
+Revises: 5e9a1c3f7b26
+Create Date: 2026-10-18 12:41:09.775310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3f0b8c912'
+down_revision = '5e9a1c3f7b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE lot_search USING fts5("
+        "name, address, pin_code, city, state, "
+        "tokenize = 'unicode61', prefix = '2 3 4')"
+    )
+    op.execute(
+        "INSERT INTO lot_search (rowid, name, address, pin_code, city, state) "
+        "SELECT parking_lot.id, parking_lot.prime_location_name, parking_lot.address, "
+        "parking_lot.pin_code, city.name, city.state "
+        "FROM parking_lot JOIN city ON city.id = parking_lot.city_id"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE lot_search")
@@ -0,0 +1,54 @@
+"""add user_stats running totals
+
+Revision ID: b6e93d2f4c81
+Revises: f8b2c5d13a74
+Create Date: 2026-10-18 15:22:09.613204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e93d2f4c81'
+down_revision = 'f8b2c5d13a74'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('lot_id', sa.Integer(), nullable=False),
+    sa.Column('visits', sa.Integer(), nullable=False),
+    sa.Column('spent', sa.Float(), nullable=False),
+    sa.Column('active', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['lot_id'], ['parking_lot.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'lot_id')
+    )
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        batch_op.create_index('ix_user_stats_lot_id', ['lot_id'], unique=False)
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_user_id_parking_timestamp', ['user_id', 'parking_timestamp'], unique=False)
+
+    # Same totals as UserStats.backfill().
+    op.execute(
+        "INSERT INTO user_stats (user_id, lot_id, visits, spent, active) "
+        "SELECT reservation.user_id, parking_spot.lot_id, count(reservation.id), "
+        "coalesce(sum(CASE WHEN (reservation.is_active = 0) THEN reservation.parking_cost END), 0), "
+        "count(CASE WHEN (reservation.is_active = 1) THEN 1 END) "
+        "FROM reservation JOIN parking_spot ON parking_spot.id = reservation.spot_id "
+        "GROUP BY reservation.user_id, parking_spot.lot_id"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_user_id_parking_timestamp')
+
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_stats_lot_id')
+
+    op.drop_table('user_stats')
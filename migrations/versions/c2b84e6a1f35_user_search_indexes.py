@@ -0,0 +1,30 @@
+"""add lowercase search indexes on user
+
+Revision ID: c2b84e6a1f35
+Revises: a7d3f0b8c912
+Create Date: 2026-10-18 13:30:52.914066
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2b84e6a1f35'
+down_revision = 'a7d3f0b8c912'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_username_lower', [sa.text('lower(username)')], unique=False)
+        batch_op.create_index('ix_user_email_lower', [sa.text('lower(email)')], unique=False)
+        batch_op.create_index('ix_user_full_name_lower', [sa.text('lower(full_name)')], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_full_name_lower')
+        batch_op.drop_index('ix_user_email_lower')
+        batch_op.drop_index('ix_user_username_lower')
@@ -0,0 +1,49 @@
+"""add lot_daily_stats rollup
+
+Revision ID: d41f7a9c2e58
+Revises: c2b84e6a1f35
+Create Date: 2026-10-18 14:05:12.408833
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f7a9c2e58'
+down_revision = 'c2b84e6a1f35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('lot_daily_stats',
+    sa.Column('lot_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('sessions', sa.Integer(), nullable=False),
+    sa.Column('occupied_minutes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['lot_id'], ['parking_lot.id'], ),
+    sa.PrimaryKeyConstraint('lot_id', 'day')
+    )
+    with op.batch_alter_table('lot_daily_stats', schema=None) as batch_op:
+        batch_op.create_index('ix_lot_daily_stats_day', ['day'], unique=False)
+
+    # Same rollup as LotDailyStats.backfill().
+    op.execute(
+        "INSERT INTO lot_daily_stats (lot_id, day, revenue, sessions, occupied_minutes) "
+        "SELECT parking_spot.lot_id, date(reservation.leaving_timestamp), "
+        "coalesce(sum(reservation.parking_cost), 0), count(reservation.id), "
+        "coalesce(sum(CAST((julianday(reservation.leaving_timestamp) "
+        "- julianday(reservation.parking_timestamp)) * 1440 AS INTEGER)), 0) "
+        "FROM reservation JOIN parking_spot ON parking_spot.id = reservation.spot_id "
+        "WHERE reservation.is_active = 0 AND reservation.leaving_timestamp IS NOT NULL "
+        "GROUP BY parking_spot.lot_id, date(reservation.leaving_timestamp)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('lot_daily_stats', schema=None) as batch_op:
+        batch_op.drop_index('ix_lot_daily_stats_day')
+
+    op.drop_table('lot_daily_stats')
@@ -0,0 +1,48 @@
+"""add reservation_archive
+
+Revision ID: e5a70c4b9d16
+Revises: b6e93d2f4c81
+Create Date: 2026-10-18 15:58:44.127301
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a70c4b9d16'
+down_revision = 'b6e93d2f4c81'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reservation_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('spot_id', sa.Integer(), nullable=False),
+    sa.Column('lot_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('vehicle_number', sa.String(length=20), nullable=False),
+    sa.Column('parking_timestamp', sa.DateTime(), nullable=False),
+    sa.Column('leaving_timestamp', sa.DateTime(), nullable=False),
+    sa.Column('parking_cost', sa.Float(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['lot_id'], ['parking_lot.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('reservation_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_archive_parking_timestamp', ['parking_timestamp'], unique=False)
+        batch_op.create_index('ix_reservation_archive_user_id_parking_timestamp', ['user_id', 'parking_timestamp'], unique=False)
+        batch_op.create_index('ix_reservation_archive_lot_id_parking_timestamp', ['lot_id', 'parking_timestamp'], unique=False)
+        batch_op.create_index('ix_reservation_archive_vehicle_number', ['vehicle_number'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_archive_vehicle_number')
+        batch_op.drop_index('ix_reservation_archive_lot_id_parking_timestamp')
+        batch_op.drop_index('ix_reservation_archive_user_id_parking_timestamp')
+        batch_op.drop_index('ix_reservation_archive_parking_timestamp')
+
+    op.drop_table('reservation_archive')
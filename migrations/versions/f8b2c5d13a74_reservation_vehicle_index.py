@@ -0,0 +1,26 @@
+"""add vehicle number index on reservation
+
+Revision ID: f8b2c5d13a74
+Revises: d41f7a9c2e58
+Create Date: 2026-10-18 14:41:37.220519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f8b2c5d13a74'
+down_revision = 'd41f7a9c2e58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_vehicle_number', ['vehicle_number'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_vehicle_number')
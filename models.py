@@ -1,8 +1,10 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from flask_login import UserMixin
+from database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class User(db.Model, UserMixin):
@@ -52,6 +54,9 @@ class City(db.Model):
 
 class ParkingLot(db.Model):
     __tablename__ = 'parking_lot'
+    __table_args__ = (
+        db.Index('ix_parking_lot_city_id', 'city_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     city_id = db.Column(db.Integer, db.ForeignKey('city.id'), nullable=False)
@@ -60,15 +65,49 @@ class ParkingLot(db.Model):
     pin_code = db.Column(db.String(10))
     price_per_hour = db.Column(db.Float, nullable=False)
     max_spots = db.Column(db.Integer, nullable=False)
+    occupied = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    available = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     spots = db.relationship('ParkingSpot', backref='lot', cascade='all, delete-orphan', lazy=True)
 
     def occupied_count(self):
-        return sum(1 for spot in self.spots if spot.is_occupied)
+        return self.occupied
 
     def available_spots(self):
-        return sum(1 for spot in self.spots if spot.status == 'A')
+        return self.available
+
+    @classmethod
+    def adjust_counters(cls, lot_id, occupied_delta):
+        # Done in SQL so concurrent requests never overwrite each other's counts.
+        # Returns the new (occupied, available) row.
+        return db.session.execute(
+            db.update(cls)
+            .where(cls.id == lot_id)
+            .values(
+                occupied=cls.occupied + occupied_delta,
+                available=cls.available - occupied_delta
+            )
+            .returning(cls.occupied, cls.available)
+            .execution_options(synchronize_session=False)
+        ).first()
+
+    @classmethod
+    def reconcile_counters(cls):
+        # Rebuild the stored counters from parking_spot, the source of truth.
+        def spot_count(status):
+            return (
+                db.select(db.func.count(ParkingSpot.id))
+                .where(ParkingSpot.lot_id == cls.id, ParkingSpot.status == status)
+                .scalar_subquery()
+            )
+
+        result = db.session.execute(
+            db.update(cls)
+            .values(occupied=spot_count('O'), available=spot_count('A'))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
 
     def __repr__(self):
         return f"<ParkingLot {self.prime_location_name} in CityID {self.city_id}>"
@@ -77,6 +116,10 @@ class ParkingLot(db.Model):
 
 class ParkingSpot(db.Model):
     __tablename__ = 'parking_spot'
+    __table_args__ = (
+        # Free-spot lookup in the allocator and per-lot spot listings.
+        db.Index('ix_parking_spot_lot_id_status', 'lot_id', 'status'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id', ondelete='CASCADE'), nullable=False)
@@ -101,6 +144,21 @@ class ParkingSpot(db.Model):
 
 class Reservation(db.Model):
     __tablename__ = 'reservation'
+    __table_args__ = (
+        # A user's active/completed reservations, newest first.
+        db.Index('ix_reservation_user_id_is_active', 'user_id', 'is_active', 'parking_timestamp'),
+        # ParkingSpot.reservation and the active-reservation checks per spot.
+        db.Index('ix_reservation_spot_id_is_active', 'spot_id', 'is_active'),
+        # A user's whole history, newest first (user summary).
+        db.Index('ix_reservation_user_id_parking_timestamp', 'user_id', 'parking_timestamp'),
+        # Admin summary ordering.
+        db.Index('ix_reservation_parking_timestamp', 'parking_timestamp'),
+        # Vehicle lookups and prefix filters in the admin reservation grid.
+        db.Index('ix_reservation_vehicle_number', 'vehicle_number'),
+        # Ids are never reused, so an archived id is never handed out again
+        # and listings can rely on ids only increasing.
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     spot_id = db.Column(db.Integer, db.ForeignKey('parking_spot.id'), nullable=False)
@@ -114,9 +172,373 @@ class Reservation(db.Model):
     def __repr__(self):
         return f"<Reservation {self.id} - User {self.user_id} - Spot {self.spot_id}>"
 
+    @classmethod
+    def minutes_parked(cls, until=None):
+        """SQL for whole minutes parked, measured to the leaving time or to `until`."""
+        return sql_minutes_between(cls.parking_timestamp, cls.leaving_timestamp if until is None else until)
+
     @property
     def total_hours(self):
         if self.leaving_timestamp and self.parking_timestamp:
             duration = self.leaving_timestamp - self.parking_timestamp
             return round(duration.total_seconds() / 3600, 2)
         return 0
+
+
+class ReservationArchive(db.Model):
+    """Completed reservations moved out of `reservation` by archive.py.
+
+    Rows keep their reservation id. The lot id is stored on the row
+    itself, so no join to parking_spot is needed.
+    """
+    __tablename__ = 'reservation_archive'
+    __table_args__ = (
+        db.Index('ix_reservation_archive_parking_timestamp', 'parking_timestamp'),
+        db.Index('ix_reservation_archive_user_id_parking_timestamp', 'user_id', 'parking_timestamp'),
+        db.Index('ix_reservation_archive_lot_id_parking_timestamp', 'lot_id', 'parking_timestamp'),
+        db.Index('ix_reservation_archive_vehicle_number', 'vehicle_number'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    spot_id = db.Column(db.Integer, nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    vehicle_number = db.Column(db.String(20), nullable=False)
+    parking_timestamp = db.Column(db.DateTime, nullable=False)
+    leaving_timestamp = db.Column(db.DateTime, nullable=False)
+    parking_cost = db.Column(db.Float)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def minutes_parked(cls):
+        """SQL for whole minutes parked."""
+        return sql_minutes_between(cls.parking_timestamp, cls.leaving_timestamp)
+
+    @classmethod
+    def newest(cls):
+        """(parking_timestamp, id) bounds of the archive, or None while it is empty.
+
+        Every archived row sorts at or before both values, so listings
+        newer than this never need to read the archive.
+        """
+        # Separate subqueries, so SQLite reads each maximum off an index.
+        bounds = db.session.query(
+            db.select(db.func.max(cls.parking_timestamp)).scalar_subquery().label('parking_timestamp'),
+            db.select(db.func.max(cls.id)).scalar_subquery().label('id')
+        ).one()
+        return None if bounds.id is None else bounds
+
+    def __repr__(self):
+        return f"<ReservationArchive {self.id} - User {self.user_id} - Lot {self.lot_id}>"
+
+
+def completed_stays():
+    """Subquery of every completed stay, live or archived: lot_id,
+    parking_timestamp, leaving_timestamp and parking_cost."""
+    return db.union_all(
+        db.select(
+            ParkingSpot.lot_id, Reservation.parking_timestamp,
+            Reservation.leaving_timestamp, Reservation.parking_cost
+        )
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .where(Reservation.is_active == False, Reservation.leaving_timestamp.isnot(None)),
+        db.select(
+            ReservationArchive.lot_id, ReservationArchive.parking_timestamp,
+            ReservationArchive.leaving_timestamp, ReservationArchive.parking_cost
+        )
+    ).subquery()
+
+
+def sql_minutes_between(start, end):
+    """SQL for whole minutes from start to end, rounded down as pricing.elapsed_minutes() does.
+
+    Computed from milliseconds, so floating point error in julianday()
+    never drops a minute.
+    """
+    elapsed_ms = db.cast(db.func.round((db.func.julianday(end) - db.func.julianday(start)) * 86400000), db.Integer)
+    return elapsed_ms // 60000
+
+
+class DataVersion(db.Model):
+    """A counter per data set, bumped on every change, used to build ETags."""
+    __tablename__ = 'data_version'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    # Lots, their occupancy and their spots.
+    LOTS = 'lots'
+    # Existing User and Admin rows (see identity.IdentityCache).
+    IDENTITIES = 'identities'
+
+    @classmethod
+    def current(cls, name):
+        return db.session.query(cls.version).filter_by(name=name).scalar() or 0
+
+    @classmethod
+    def bump(cls, name, session=None):
+        (session or db.session).execute(
+            sqlite_insert(cls)
+            .values(name=name, version=1)
+            .on_conflict_do_update(index_elements=[cls.name], set_={'version': cls.version + 1})
+        )
+
+    def __repr__(self):
+        return f"<DataVersion {self.name}={self.version}>"
+
+
+class LotDailyStats(db.Model):
+    """Completed reservations rolled up per lot and day.
+
+    A stay is counted on the day it ends, with all of its revenue and
+    minutes. release_spot adds to the day as it happens; backfill()
+    rebuilds the table from the reservation history.
+    """
+    __tablename__ = 'lot_daily_stats'
+    __table_args__ = (
+        # Date-range reports across all lots.
+        db.Index('ix_lot_daily_stats_day', 'day'),
+    )
+
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    occupied_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def record(cls, lot_id, day, revenue, minutes):
+        db.session.execute(
+            sqlite_insert(cls)
+            .values(lot_id=lot_id, day=day, revenue=revenue, sessions=1, occupied_minutes=minutes)
+            .on_conflict_do_update(
+                index_elements=[cls.lot_id, cls.day],
+                set_={
+                    'revenue': cls.revenue + revenue,
+                    'sessions': cls.sessions + 1,
+                    'occupied_minutes': cls.occupied_minutes + minutes
+                }
+            )
+        )
+
+    @classmethod
+    def backfill(cls):
+        """Rebuild every row from completed reservations, archived ones included.
+        Returns the row count."""
+        db.session.execute(db.delete(cls))
+        stays = completed_stays()
+        day = db.func.date(stays.c.leaving_timestamp)
+        rollup = (
+            db.select(
+                stays.c.lot_id,
+                day,
+                db.func.coalesce(db.func.sum(stays.c.parking_cost), 0),
+                db.func.count(),
+                db.func.coalesce(db.func.sum(
+                    sql_minutes_between(stays.c.parking_timestamp, stays.c.leaving_timestamp)
+                ), 0)
+            )
+            .group_by(stays.c.lot_id, day)
+        )
+        return db.session.execute(
+            db.insert(cls).from_select(
+                ['lot_id', 'day', 'revenue', 'sessions', 'occupied_minutes'], rollup
+            )
+        ).rowcount
+
+    def __repr__(self):
+        return f"<LotDailyStats lot={self.lot_id} {self.day}>"
+
+
+class UserStats(db.Model):
+    """Running reservation totals per user and lot.
+
+    reserve_spot and release_spot keep these up to date, so the user
+    summary never has to read a user's whole history.
+    """
+    __tablename__ = 'user_stats'
+    __table_args__ = (
+        # Clearing a deleted lot's rows.
+        db.Index('ix_user_stats_lot_id', 'lot_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), primary_key=True)
+    visits = db.Column(db.Integer, nullable=False, default=0)
+    spent = db.Column(db.Float, nullable=False, default=0)
+    active = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def reserved(cls, user_id, lot_id):
+        db.session.execute(
+            sqlite_insert(cls)
+            .values(user_id=user_id, lot_id=lot_id, visits=1, spent=0, active=1)
+            .on_conflict_do_update(
+                index_elements=[cls.user_id, cls.lot_id],
+                set_={'visits': cls.visits + 1, 'active': cls.active + 1}
+            )
+        )
+
+    @classmethod
+    def released(cls, user_id, lot_id, cost):
+        db.session.execute(
+            sqlite_insert(cls)
+            .values(user_id=user_id, lot_id=lot_id, visits=1, spent=cost, active=0)
+            .on_conflict_do_update(
+                index_elements=[cls.user_id, cls.lot_id],
+                set_={'spent': cls.spent + cost, 'active': cls.active - 1}
+            )
+        )
+
+    @classmethod
+    def backfill(cls):
+        """Rebuild every row from all reservations, archived ones included.
+        Returns the row count."""
+        db.session.execute(db.delete(cls))
+        reservations = db.union_all(
+            db.select(
+                Reservation.user_id,
+                ParkingSpot.lot_id,
+                db.case((Reservation.is_active == False, Reservation.parking_cost)).label('cost'),
+                db.case((Reservation.is_active == True, 1), else_=0).label('active')
+            )
+            .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id),
+            db.select(
+                ReservationArchive.user_id,
+                ReservationArchive.lot_id,
+                ReservationArchive.parking_cost,
+                db.literal(0)
+            )
+        ).subquery()
+        totals = (
+            db.select(
+                reservations.c.user_id,
+                reservations.c.lot_id,
+                db.func.count(),
+                db.func.coalesce(db.func.sum(reservations.c.cost), 0),
+                db.func.sum(reservations.c.active)
+            )
+            .group_by(reservations.c.user_id, reservations.c.lot_id)
+        )
+        return db.session.execute(
+            db.insert(cls).from_select(['user_id', 'lot_id', 'visits', 'spent', 'active'], totals)
+        ).rowcount
+
+    def __repr__(self):
+        return f"<UserStats user={self.user_id} lot={self.lot_id}>"
+
+
+class Job(db.Model):
+    """A unit of background work, run by jobs.JobRunner.
+
+    run_after is when a queued job may next be claimed; while a job is
+    running it is the end of the worker's lease, after which another
+    worker may claim the job again.
+    """
+    __tablename__ = 'job'
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    PENDING = (QUEUED, RUNNING)
+
+    __table_args__ = (
+        # Claiming the next due job.
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+        # At most one pending job per dedupe key.
+        db.Index('uq_job_dedupe_key_pending', 'dedupe_key', unique=True,
+                 sqlite_where=db.text("status IN ('queued', 'running')")),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    dedupe_key = db.Column(db.String(100))
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @classmethod
+    def enqueue(cls, kind, params=None, dedupe_key=None, max_attempts=3):
+        """Add a job, or return the pending one with the same dedupe key.
+        The caller commits."""
+        while True:
+            job_id = db.session.execute(
+                sqlite_insert(cls)
+                .values(kind=kind, params=params or {}, dedupe_key=dedupe_key,
+                        max_attempts=max_attempts, run_after=datetime.utcnow())
+                .on_conflict_do_nothing(
+                    index_elements=[cls.dedupe_key],
+                    index_where=db.text("status IN ('queued', 'running')")
+                )
+                .returning(cls.id)
+            ).scalar()
+            if job_id is None:
+                # Deduplicated; loop if that job finished in the meantime.
+                job_id = db.session.query(cls.id).filter(
+                    cls.dedupe_key == dedupe_key, cls.status.in_(cls.PENDING)
+                ).scalar()
+            if job_id is not None:
+                return db.session.get(cls, job_id)
+
+    @classmethod
+    def claim(cls, lease_seconds):
+        """Mark the longest-due job running and return its (id, kind, params,
+        attempts, max_attempts), or None when nothing is due. Commits."""
+        now = datetime.utcnow()
+        # Jobs whose worker died on their last attempt are not retried.
+        db.session.execute(
+            db.update(cls)
+            .where(cls.status == cls.RUNNING, cls.run_after <= now, cls.attempts >= cls.max_attempts)
+            .values(status=cls.FAILED, error="The worker stopped before the job finished.", finished_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        due = db.and_(cls.status.in_(cls.PENDING), cls.run_after <= now)
+        job = db.session.execute(
+            db.update(cls)
+            .where(cls.id == db.select(cls.id).where(due).order_by(cls.run_after, cls.id).limit(1).scalar_subquery(), due)
+            .values(status=cls.RUNNING, attempts=cls.attempts + 1, started_at=now,
+                    run_after=now + timedelta(seconds=lease_seconds))
+            .returning(cls.id, cls.kind, cls.params, cls.attempts, cls.max_attempts)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.session.commit()
+        return job
+
+    @classmethod
+    def finish(cls, job_id, attempt, result=None, error=None, retry_at=None):
+        """Record how an attempt ended: succeeded without an error, queued
+        again at retry_at, or failed. Ignored if the attempt lost its lease
+        to another worker. The caller commits."""
+        if error is None:
+            values = dict(status=cls.SUCCEEDED, result=result, error=None)
+        elif retry_at is not None:
+            values = dict(status=cls.QUEUED, error=error, run_after=retry_at)
+        else:
+            values = dict(status=cls.FAILED, error=error)
+        if retry_at is None:
+            values['finished_at'] = datetime.utcnow()
+        db.session.execute(
+            db.update(cls)
+            .where(cls.id == job_id, cls.attempts == attempt, cls.status == cls.RUNNING)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def seconds_until_due(cls):
+        """Seconds until the next queued job is due, or None if none is queued."""
+        run_after = db.session.query(db.func.min(cls.run_after)).filter(cls.status == cls.QUEUED).scalar()
+        if run_after is None:
+            return None
+        return max(0.0, (run_after - datetime.utcnow()).total_seconds())
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
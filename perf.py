@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import deque
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestProfile:
+    """SQL activity of one request, gathered by the engine event listeners."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_seconds = 0.0
+        self.slowest = (0.0, None)
+        # statement -> [executions, distinct parameter sets]
+        self.statements = {}
+
+    def record(self, statement, parameters, elapsed):
+        self.query_count += 1
+        self.sql_seconds += elapsed
+        if elapsed > self.slowest[0]:
+            self.slowest = (elapsed, statement)
+        entry = self.statements.setdefault(statement, [0, set()])
+        entry[0] += 1
+        entry[1].add(repr(parameters))
+
+    def repeated_statements(self, threshold):
+        """Statements run `threshold` or more times with different parameters."""
+        return sorted(
+            ((statement, executions) for statement, (executions, params) in self.statements.items()
+             if executions >= threshold and len(params) > 1),
+            key=lambda item: -item[1]
+        )
+
+
+class _Store:
+    def __init__(self, history, n_plus_one_threshold):
+        self.history = history
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.lock = threading.Lock()
+        self.samples = {}
+
+
+class QueryProfiler:
+    """Opt-in per-request SQL instrumentation.
+
+    With SQL_PROFILING enabled, every request records its query count, total
+    SQL time, slowest statement and any statement repeated with different
+    parameters at least SQL_PROFILING_N_PLUS_ONE times (the usual N+1 lazy
+    load). The last SQL_PROFILING_HISTORY requests per endpoint are kept in
+    memory; nothing is written to the database.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_PROFILING', False)
+        app.config.setdefault('SQL_PROFILING_HISTORY', 100)
+        app.config.setdefault('SQL_PROFILING_N_PLUS_ONE', 3)
+        app.extensions['query_profiler'] = _Store(
+            app.config['SQL_PROFILING_HISTORY'],
+            app.config['SQL_PROFILING_N_PLUS_ONE']
+        )
+        if app.config['SQL_PROFILING']:
+            app.before_request(_start_profile)
+            app.after_request(_finish_profile)
+
+    @property
+    def enabled(self):
+        return current_app.config['SQL_PROFILING']
+
+    @property
+    def _store(self):
+        return current_app.extensions['query_profiler']
+
+    def record(self, endpoint, profile, duration):
+        store = self._store
+        repeated = profile.repeated_statements(store.n_plus_one_threshold)
+        sample = {
+            'duration_ms': duration * 1000,
+            'queries': profile.query_count,
+            'sql_ms': profile.sql_seconds * 1000,
+            'slowest_ms': profile.slowest[0] * 1000,
+            'slowest_statement': profile.slowest[1],
+            'repeated': repeated
+        }
+        with store.lock:
+            samples = store.samples.get(endpoint)
+            if samples is None:
+                samples = store.samples[endpoint] = deque(maxlen=store.history)
+            samples.append(sample)
+
+    def reset(self):
+        store = self._store
+        with store.lock:
+            store.samples.clear()
+
+    def report(self):
+        """Per-endpoint aggregates, the heaviest endpoints by total SQL time first."""
+        store = self._store
+        with store.lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in store.samples.items()}
+
+        endpoints = []
+        for endpoint, samples in snapshot.items():
+            durations = sorted(sample['duration_ms'] for sample in samples)
+            slowest = max(samples, key=lambda sample: sample['slowest_ms'])
+            repeated = {}
+            for sample in samples:
+                for statement, executions in sample['repeated']:
+                    repeated[statement] = max(repeated.get(statement, 0), executions)
+            endpoints.append({
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'avg_queries': round(sum(s['queries'] for s in samples) / len(samples), 1),
+                'max_queries': max(s['queries'] for s in samples),
+                'avg_sql_ms': round(sum(s['sql_ms'] for s in samples) / len(samples), 2),
+                'total_sql_ms': round(sum(s['sql_ms'] for s in samples), 2),
+                'p50_ms': round(durations[len(durations) // 2], 2),
+                'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 2),
+                'slowest_ms': round(slowest['slowest_ms'], 2),
+                'slowest_statement': slowest['slowest_statement'],
+                'n_plus_one': [
+                    {'statement': statement, 'executions': executions}
+                    for statement, executions in sorted(repeated.items(), key=lambda item: -item[1])
+                ]
+            })
+        return sorted(endpoints, key=lambda item: -item['total_sql_ms'])
+
+
+query_profiler = QueryProfiler()
+
+
+def _start_profile():
+    g.sql_profile = RequestProfile()
+
+
+def _finish_profile(response):
+    profile = g.pop('sql_profile', None)
+    if profile is not None and request.endpoint:
+        duration = time.perf_counter() - profile.started
+        query_profiler.record(request.endpoint, profile, duration)
+        response.headers.add(
+            'Server-Timing',
+            f'sql;dur={profile.sql_seconds * 1000:.1f};desc="{profile.query_count} queries"'
+        )
+    return response
+
+
+def _current_profile():
+    if has_request_context():
+        return g.get('sql_profile')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile()
+    started = conn.info.get('query_started')
+    if profile is not None and started:
+        profile.record(statement, parameters, time.perf_counter() - started.pop())
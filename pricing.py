@@ -0,0 +1,82 @@
+from math import ceil
+
+from sqlalchemy import text
+
+from models import db
+
+# Reservations fetched and repriced per round trip by rebill_reservations().
+REBILL_BATCH_SIZE = 100000
+
+
+def elapsed_minutes(start, end):
+    return int((end - start).total_seconds() // 60)
+
+
+def parking_cost(price_per_hour, minutes):
+    """Tariff for one stay: a full hour up to 60 minutes, then per minute, rounded up."""
+    if minutes <= 60:
+        return price_per_hour
+    return ceil(price_per_hour / 60 * minutes)
+
+
+def parking_costs(prices, minutes):
+    """parking_cost() over whole arrays of hourly prices and minutes."""
+    # NumPy is imported on first use, so starting a worker does not pay for it.
+    import numpy as np
+    prices = np.asarray(prices, dtype=np.float64)
+    minutes = np.asarray(minutes, dtype=np.float64)
+    return np.where(minutes <= 60, prices, np.ceil(prices / 60 * minutes))
+
+
+def minutes_between(starts, ends):
+    """Whole minutes between two arrays of datetimes or ISO timestamp strings."""
+    import numpy as np
+    starts = np.asarray(starts, dtype='datetime64[us]')
+    ends = np.asarray(ends, dtype='datetime64[us]')
+    return (ends - starts) // np.timedelta64(1, 'm')
+
+
+def rebill_reservations(batch_size=REBILL_BATCH_SIZE):
+    """Reprice every completed reservation at its lot's current hourly rate.
+
+    Works through the table in id order, one batch per transaction, and only
+    writes rows whose cost actually changes. Returns (repriced, changed).
+    """
+    import numpy as np
+
+    # Timestamps are read as raw strings and parsed by NumPy in one go,
+    # which is far cheaper than building a datetime per row.
+    select_batch = text(
+        "SELECT reservation.id, parking_lot.price_per_hour, "
+        "reservation.parking_timestamp, reservation.leaving_timestamp, "
+        "reservation.parking_cost "
+        "FROM reservation "
+        "JOIN parking_spot ON parking_spot.id = reservation.spot_id "
+        "JOIN parking_lot ON parking_lot.id = parking_spot.lot_id "
+        "WHERE reservation.id > :after AND reservation.is_active = 0 "
+        "AND reservation.leaving_timestamp IS NOT NULL "
+        "ORDER BY reservation.id LIMIT :limit"
+    )
+    update_cost = text("UPDATE reservation SET parking_cost = :cost WHERE id = :id")
+
+    repriced = changed = 0
+    after = 0
+    while True:
+        rows = db.session.execute(select_batch, {'after': after, 'limit': batch_size}).all()
+        if not rows:
+            break
+        ids, prices, parked, left, stored = zip(*rows)
+        costs = parking_costs(prices, minutes_between(parked, left))
+        stored = np.array([np.nan if cost is None else cost for cost in stored], dtype=np.float64)
+
+        stale = np.flatnonzero(costs != stored)
+        if stale.size:
+            db.session.execute(update_cost, [
+                {'id': ids[i], 'cost': float(costs[i])} for i in stale
+            ])
+        db.session.commit()
+
+        repriced += len(rows)
+        changed += int(stale.size)
+        after = ids[-1]
+    return repriced, changed
@@ -0,0 +1,11 @@
+"""Production WSGI entry point: gunicorn -c gunicorn.conf.py
+
+Uses config.ProductionConfig unless APP_CONFIG names another. The
+`flask` commands are left out, so web workers never import Alembic.
+(Not called wsgi.py: `flask` would load that before app.py.)
+"""
+import os
+
+from app import create_app
+
+app = create_app(os.environ.get('APP_CONFIG', 'config.ProductionConfig'), cli=False)
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from archive import archive_spot_reservations
+from models import db, ParkingLot, ParkingSpot
+
+# Rows per executemany batch when inserting spots, and ids per IN (...) list
+# when deleting them. Both keep memory and statement size bounded no matter
+# how large the lot is.
+INSERT_BATCH_SIZE = 5000
+DELETE_BATCH_SIZE = 500
+
+
+def provision_spots(lot_id, count):
+    """Bulk-insert `count` free spots into a lot. Counters are left to the caller."""
+    spot_table = ParkingSpot.__table__
+    now = datetime.utcnow()
+    remaining = count
+    while remaining > 0:
+        batch = min(remaining, INSERT_BATCH_SIZE)
+        db.session.execute(
+            spot_table.insert(),
+            [{'lot_id': lot_id, 'status': 'A', 'created_at': now}] * batch
+        )
+        remaining -= batch
+
+
+def remove_free_spots(lot_id, count):
+    """Delete up to `count` free spots from a lot, newest first.
+
+    Spots that get occupied while this runs are skipped. The completed
+    reservations of removed spots are billing history of a lot that still
+    exists, so they move to reservation_archive, which keeps the lot id.
+    Returns the number of spots removed.
+    """
+    candidate_ids = db.session.execute(
+        db.select(ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A')
+        .order_by(ParkingSpot.id.desc())
+        .limit(count)
+    ).scalars().all()
+
+    removed = 0
+    for start in range(0, len(candidate_ids), DELETE_BATCH_SIZE):
+        batch = candidate_ids[start:start + DELETE_BATCH_SIZE]
+        deleted_ids = db.session.execute(
+            db.delete(ParkingSpot)
+            .where(ParkingSpot.id.in_(batch), ParkingSpot.status == 'A')
+            .returning(ParkingSpot.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if deleted_ids:
+            archive_spot_reservations(lot_id, deleted_ids)
+        removed += len(deleted_ids)
+    return removed
+
+
+def resize_lot(lot, new_size):
+    """Grow or shrink a lot to `new_size` spots.
+
+    Growing inserts spots in bulk; shrinking removes free spots only.
+    Returns False, without changing anything, when there are not enough
+    free spots to shrink that far.
+    """
+    current_size = lot.occupied + lot.available
+    if new_size < current_size and current_size - new_size > lot.available:
+        return False
+
+    if new_size > current_size:
+        added = new_size - current_size
+        provision_spots(lot.id, added)
+    elif new_size < current_size:
+        added = -remove_free_spots(lot.id, current_size - new_size)
+    else:
+        added = 0
+
+    if added:
+        ParkingLot.query.filter_by(id=lot.id).update(
+            {ParkingLot.available: ParkingLot.available + added},
+            synchronize_session=False
+        )
+    lot.max_spots = current_size + added
+    return True
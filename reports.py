@@ -0,0 +1,414 @@
+"""Reservation listings and exports shared by the admin summary and the API."""
+import heapq
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from models import db, City, LotDailyStats, ParkingLot, ParkingSpot, Reservation, ReservationArchive, User
+from pricing import elapsed_minutes
+
+# Sort keys accepted for listings, as column names shared by reservation
+# and reservation_archive. id breaks ties, so every ordering is total and
+# a cursor always points at exactly one row.
+SORT_COLUMNS = {
+    'parked_at': 'parking_timestamp',
+    'id': 'id',
+}
+
+# Filtered counts stop here and report a lower bound instead.
+COUNT_LIMIT = 10000
+
+# Rows fetched per round trip while exporting.
+EXPORT_CHUNK_SIZE = 1000
+
+ReservationFilters = namedtuple(
+    'ReservationFilters', 'lot_id user_id vehicle start end city_id since', defaults=(None,) * 7
+)
+
+RESERVATION_EXPORT_HEADER = (
+    'Reservation ID', 'Parked At', 'Left At', 'Duration (min)', 'Lot ID', 'Lot', 'City', 'Spot ID',
+    'User ID', 'Username', 'Full Name', 'Vehicle', 'Cost', 'Status'
+)
+REVENUE_EXPORT_HEADER = ('Day', 'Lot ID', 'Lot', 'City', 'Sessions', 'Occupied Minutes', 'Revenue')
+
+# A listing query over one table, and that table's model. Listings read
+# the live table and, when it may hold matching rows, the archive; for the
+# archive `newest` is ReservationArchive.newest().
+Source = namedtuple('Source', 'query model newest')
+
+
+def reservation_query(filters=ReservationFilters()):
+    """One row per reservation with its user, spot and lot, filtered but not ordered."""
+    query = (
+        db.session.query(
+            Reservation.id,
+            Reservation.user_id,
+            User.username,
+            User.full_name,
+            Reservation.spot_id,
+            ParkingSpot.lot_id,
+            ParkingLot.prime_location_name,
+            Reservation.vehicle_number,
+            Reservation.is_active,
+            Reservation.parking_timestamp,
+            Reservation.leaving_timestamp,
+            Reservation.parking_cost
+        )
+        .join(User, User.id == Reservation.user_id)
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .join(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
+    )
+    return apply_filters(query, filters)
+
+
+def archived_reservation_query(filters=ReservationFilters()):
+    """reservation_query() over reservation_archive, with the same columns."""
+    query = (
+        db.session.query(
+            ReservationArchive.id,
+            ReservationArchive.user_id,
+            User.username,
+            User.full_name,
+            ReservationArchive.spot_id,
+            ReservationArchive.lot_id,
+            ParkingLot.prime_location_name,
+            ReservationArchive.vehicle_number,
+            db.literal(False).label('is_active'),
+            ReservationArchive.parking_timestamp,
+            ReservationArchive.leaving_timestamp,
+            ReservationArchive.parking_cost
+        )
+        .join(User, User.id == ReservationArchive.user_id)
+        .join(ParkingLot, ParkingLot.id == ReservationArchive.lot_id)
+    )
+    return apply_filters(query, filters, ReservationArchive)
+
+
+def reservation_sources(filters=ReservationFilters()):
+    """reservation_query() and, when it may hold matches, archived_reservation_query(), as Sources."""
+    sources = [Source(reservation_query(filters), Reservation, None)]
+    newest = archive_bounds(filters)
+    if newest is not None:
+        sources.append(Source(archived_reservation_query(filters), ReservationArchive, newest))
+    return sources
+
+
+def archive_bounds(filters=ReservationFilters()):
+    """ReservationArchive.newest(), or None if no archived row can match `filters`."""
+    newest = ReservationArchive.newest()
+    if (newest is None
+            or (filters.start and filters.start > newest.parking_timestamp.date())
+            or (filters.since and filters.since > newest.parking_timestamp)):
+        return None
+    return newest
+
+
+def user_reservations_query(user_id, active=None, now=None):
+    """A user's reservations with their lot and city, not ordered.
+
+    `active` picks active (True) or completed (False) reservations, or
+    both (None). `minutes` is computed in SQL: up to `now` for active
+    reservations, up to the leaving time for completed ones, and NULL for
+    active ones when listing both.
+    """
+    query = (
+        db.session.query(
+            Reservation.id,
+            Reservation.spot_id,
+            Reservation.vehicle_number,
+            Reservation.parking_timestamp,
+            Reservation.leaving_timestamp,
+            Reservation.parking_cost,
+            Reservation.is_active,
+            Reservation.minutes_parked(now if active else None).label('minutes'),
+            ParkingSpot.lot_id,
+            ParkingLot.prime_location_name,
+            ParkingLot.address,
+            ParkingLot.pin_code,
+            ParkingLot.price_per_hour,
+            City.name.label('city_name'),
+            City.state.label('city_state')
+        )
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .join(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
+        .join(City, City.id == ParkingLot.city_id)
+        .filter(Reservation.user_id == user_id)
+    )
+    if active is None:
+        return query
+    query = query.filter(Reservation.is_active == active)
+    if active:
+        return query.filter(Reservation.leaving_timestamp == None)
+    return query.filter(Reservation.leaving_timestamp != None)
+
+
+def user_reservation_sources(user_id, active=None, now=None):
+    """user_reservations_query(), plus the user's archived reservations
+    unless only active ones are wanted."""
+    sources = [Source(user_reservations_query(user_id, active, now), Reservation, None)]
+    newest = None if active else archive_bounds()
+    if newest is not None:
+        query = (
+            db.session.query(
+                ReservationArchive.id,
+                ReservationArchive.spot_id,
+                ReservationArchive.vehicle_number,
+                ReservationArchive.parking_timestamp,
+                ReservationArchive.leaving_timestamp,
+                ReservationArchive.parking_cost,
+                db.literal(False).label('is_active'),
+                ReservationArchive.minutes_parked().label('minutes'),
+                ReservationArchive.lot_id,
+                ParkingLot.prime_location_name,
+                ParkingLot.address,
+                ParkingLot.pin_code,
+                ParkingLot.price_per_hour,
+                City.name.label('city_name'),
+                City.state.label('city_state')
+            )
+            .join(ParkingLot, ParkingLot.id == ReservationArchive.lot_id)
+            .join(City, City.id == ParkingLot.city_id)
+            .filter(ReservationArchive.user_id == user_id)
+        )
+        sources.append(Source(query, ReservationArchive, newest))
+    return sources
+
+
+def apply_filters(query, filters, model=Reservation):
+    """Narrow a query that selects from reservation joined to parking_spot,
+    or from reservation_archive."""
+    lot_id = ParkingSpot.lot_id if model is Reservation else model.lot_id
+    if filters.lot_id is not None:
+        query = query.filter(lot_id == filters.lot_id)
+    if filters.city_id is not None:
+        query = query.filter(lot_id.in_(city_lots(filters.city_id)))
+    if filters.user_id is not None:
+        query = query.filter(model.user_id == filters.user_id)
+    if filters.vehicle:
+        # Prefix match as a range, so the vehicle_number index is used.
+        # Vehicle numbers are stored upper-cased.
+        prefix = filters.vehicle.upper()
+        query = query.filter(
+            model.vehicle_number >= prefix,
+            model.vehicle_number < prefix + '\uffff'
+        )
+    if filters.start:
+        query = query.filter(model.parking_timestamp >= datetime.combine(filters.start, time.min))
+    if filters.end:
+        query = query.filter(
+            model.parking_timestamp < datetime.combine(filters.end + timedelta(days=1), time.min)
+        )
+    if filters.since:
+        query = query.filter(model.parking_timestamp >= filters.since)
+    return query
+
+
+def city_lots(city_id):
+    return db.select(ParkingLot.id).where(ParkingLot.city_id == city_id)
+
+
+def keyset_page(sources, sort='parked_at', descending=True, cursor=None, limit=50):
+    """One page of the rows of `sources` in `sort` order. Returns (rows, next_cursor).
+
+    `cursor` is the next_cursor of the previous page; pages never skip or
+    repeat rows however deep they go, unlike OFFSET. Each source is read
+    with its own index range and the results merged, and the archive is
+    skipped whenever the page is already full of rows newer than it.
+    """
+    after = decode_cursor(sort, cursor) if cursor is not None else None
+    rows = []
+    for source in sources:
+        if (source.newest is not None and descending and len(rows) > limit
+                and sort_key(sort, rows[limit]) > sort_key(sort, source.newest)):
+            continue
+        rows.extend(source_page(source, sort, descending, after, limit))
+    rows.sort(key=lambda row: sort_key(sort, row), reverse=descending)
+
+    # One extra row was fetched to know whether another page follows.
+    next_cursor = encode_cursor(sort, rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def source_page(source, sort, descending, after, limit):
+    query, model = source.query, source.model
+    column = getattr(model, SORT_COLUMNS[sort])
+    if after is not None:
+        if sort == 'id':
+            query = query.filter(model.id < after if descending else model.id > after)
+        else:
+            key = db.tuple_(column, model.id)
+            query = query.filter(key < after if descending else key > after)
+
+    if descending:
+        query = query.order_by(column.desc(), model.id.desc())
+    else:
+        query = query.order_by(column, model.id)
+    return query.limit(limit + 1).all()
+
+
+def sort_key(sort, row):
+    """A row's position in `sort` order; also takes ReservationArchive.newest()."""
+    return row.id if sort == 'id' else (row.parking_timestamp, row.id)
+
+
+def encode_cursor(sort, row):
+    if sort == 'id':
+        return str(row.id)
+    return f"{row.parking_timestamp.isoformat()}_{row.id}"
+
+
+def decode_cursor(sort, cursor):
+    """Raises ValueError for a cursor that was not made by encode_cursor()."""
+    if sort == 'id':
+        return int(cursor)
+    parked_at, _, reservation_id = cursor.rpartition('_')
+    return datetime.fromisoformat(parked_at), int(reservation_id)
+
+
+def count_reservations(filters=ReservationFilters()):
+    """(total, exact) for a filtered listing.
+
+    Without a user or vehicle filter the total is read from lot_daily_stats
+    plus the lots' occupied counters instead of counting rows. It is exact
+    for all time; with a date range it is an estimate, as the rollup counts
+    stays by the day they ended. Other filters are counted, up to
+    COUNT_LIMIT.
+    """
+    if filters.user_id is None and not filters.vehicle:
+        completed = db.session.query(db.func.coalesce(db.func.sum(LotDailyStats.sessions), 0))
+        active = db.session.query(db.func.coalesce(db.func.sum(ParkingLot.occupied), 0))
+        if filters.lot_id is not None:
+            completed = completed.filter(LotDailyStats.lot_id == filters.lot_id)
+            active = active.filter(ParkingLot.id == filters.lot_id)
+        if filters.city_id is not None:
+            completed = completed.filter(LotDailyStats.lot_id.in_(city_lots(filters.city_id)))
+            active = active.filter(ParkingLot.city_id == filters.city_id)
+        if filters.start:
+            completed = completed.filter(LotDailyStats.day >= filters.start)
+        if filters.end:
+            completed = completed.filter(LotDailyStats.day <= filters.end)
+        total = completed.scalar()
+        # Cars still parked only fall in a range that reaches today.
+        if filters.end is None or filters.end >= datetime.utcnow().date():
+            total += active.scalar()
+        return total, not (filters.start or filters.end)
+
+    queries = [(db.session.query(Reservation.id).join(ParkingSpot, ParkingSpot.id == Reservation.spot_id), Reservation)]
+    if archive_bounds(filters) is not None:
+        queries.append((db.session.query(ReservationArchive.id), ReservationArchive))
+    count = 0
+    for query, model in queries:
+        matching = apply_filters(query, filters, model).limit(COUNT_LIMIT + 1 - count).subquery()
+        count += db.session.query(db.func.count()).select_from(matching).scalar()
+        if count > COUNT_LIMIT:
+            break
+    return min(count, COUNT_LIMIT), count <= COUNT_LIMIT
+
+
+def reservation_to_dict(row):
+    return {
+        'id': row.id,
+        'user_id': row.user_id,
+        'username': row.username,
+        'full_name': row.full_name,
+        'spot_id': row.spot_id,
+        'lot_id': row.lot_id,
+        'lot_name': row.prime_location_name,
+        'vehicle_number': row.vehicle_number,
+        'is_active': row.is_active,
+        'parked_at': row.parking_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'left_at': row.leaving_timestamp.strftime('%Y-%m-%d %H:%M:%S') if row.leaving_timestamp else None,
+        'cost': row.parking_cost
+    }
+
+
+def merged_by_id(sources, after=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Every row of `sources` with an id above `after`, in id order,
+    fetched `chunk_size` at a time from each."""
+    streams = []
+    for source in sources:
+        query = source.query
+        if after is not None:
+            query = query.filter(source.model.id > after)
+        streams.append(query.order_by(source.model.id).yield_per(chunk_size))
+    return heapq.merge(*streams, key=lambda row: row.id)
+
+
+def reservation_export_rows(filters=ReservationFilters()):
+    """Every matching reservation, archived ones included, as a row under
+    RESERVATION_EXPORT_HEADER, in id order.
+
+    Rows are fetched EXPORT_CHUNK_SIZE at a time, so memory stays flat
+    however many match.
+    """
+    sources = [
+        source._replace(
+            query=source.query.add_columns(City.name.label('city_name')).join(City, City.id == ParkingLot.city_id)
+        )
+        for source in reservation_sources(filters)
+    ]
+    for row in merged_by_id(sources, chunk_size=EXPORT_CHUNK_SIZE):
+        left_at = row.leaving_timestamp
+        yield (
+            row.id, row.parking_timestamp, left_at,
+            elapsed_minutes(row.parking_timestamp, left_at) if left_at else None,
+            row.lot_id, row.prime_location_name, row.city_name, row.spot_id,
+            row.user_id, row.username, row.full_name, row.vehicle_number,
+            row.parking_cost, 'Active' if row.is_active else 'Completed'
+        )
+
+
+def revenue_export_rows(filters=ReservationFilters()):
+    """lot_daily_stats as rows under REVENUE_EXPORT_HEADER, by day and lot.
+
+    Only the lot, city and date filters apply.
+    """
+    query = (
+        db.session.query(
+            LotDailyStats.day,
+            LotDailyStats.lot_id,
+            ParkingLot.prime_location_name,
+            City.name,
+            LotDailyStats.sessions,
+            LotDailyStats.occupied_minutes,
+            LotDailyStats.revenue
+        )
+        .join(ParkingLot, ParkingLot.id == LotDailyStats.lot_id)
+        .join(City, City.id == ParkingLot.city_id)
+        .order_by(LotDailyStats.day, LotDailyStats.lot_id)
+    )
+    if filters.lot_id is not None:
+        query = query.filter(LotDailyStats.lot_id == filters.lot_id)
+    if filters.city_id is not None:
+        query = query.filter(ParkingLot.city_id == filters.city_id)
+    if filters.start:
+        query = query.filter(LotDailyStats.day >= filters.start)
+    if filters.end:
+        query = query.filter(LotDailyStats.day <= filters.end)
+    for row in query.yield_per(EXPORT_CHUNK_SIZE):
+        yield tuple(row)
+
+
+# Export name: (rows function, header, file name stem).
+EXPORTS = {
+    'reservations': (reservation_export_rows, RESERVATION_EXPORT_HEADER, 'reservations'),
+    'revenue': (revenue_export_rows, REVENUE_EXPORT_HEADER, 'revenue'),
+}
+
+
+def filters_to_params(filters):
+    """ReservationFilters as a JSON-safe dict, e.g. for a job's params."""
+    return {
+        name: value.isoformat() if isinstance(value, date) else value
+        for name, value in filters._asdict().items() if value is not None
+    }
+
+
+def filters_from_params(params):
+    """The inverse of filters_to_params()."""
+    values = dict(params)
+    for name in ('start', 'end'):
+        if values.get(name):
+            values[name] = date.fromisoformat(values[name])
+    if values.get('since'):
+        values['since'] = datetime.fromisoformat(values['since'])
+    return ReservationFilters(**values)
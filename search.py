@@ -0,0 +1,143 @@
+import re
+
+from sqlalchemy import DDL, event, text
+
+from cache import reference_cache
+from models import db, ParkingLot
+
+# Full-text index over lot name, address, pin code, city and state. The
+# rowid is the lot id. prefix='2 3 4' keeps short type-ahead prefixes
+# (including partial pin codes) on an index lookup.
+CREATE_INDEX_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS lot_search USING fts5("
+    "name, address, pin_code, city, state, "
+    "tokenize = 'unicode61', prefix = '2 3 4')"
+)
+
+# bm25 weights, in column order: a hit on the name counts most.
+RANK_SQL = "bm25(lot_search, 10.0, 1.0, 5.0, 3.0, 2.0)"
+
+INDEX_ROWS_SQL = (
+    "INSERT INTO lot_search (rowid, name, address, pin_code, city, state) "
+    "SELECT parking_lot.id, parking_lot.prime_location_name, parking_lot.address, "
+    "parking_lot.pin_code, city.name, city.state "
+    "FROM parking_lot JOIN city ON city.id = parking_lot.city_id"
+)
+
+# Full-text index over users for the admin directory. Every word of the
+# username, email and full name is a token, so "smith" finds "Jane Smith"
+# and "example.com" finds every address at that domain. It reads its text
+# from the user table (external content) and triggers keep it in step,
+# since seed.py bulk-inserts users past the application code.
+CREATE_USER_INDEX_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+    "username, email, full_name, content = 'user', content_rowid = 'id', "
+    "tokenize = 'unicode61', prefix = '2 3 4')"
+)
+
+USER_INDEX_TRIGGERS_SQL = (
+    "CREATE TRIGGER IF NOT EXISTS user_search_insert AFTER INSERT ON user BEGIN "
+    "INSERT INTO user_search (rowid, username, email, full_name) "
+    "VALUES (new.id, new.username, new.email, new.full_name); END",
+    "CREATE TRIGGER IF NOT EXISTS user_search_delete AFTER DELETE ON user BEGIN "
+    "INSERT INTO user_search (user_search, rowid, username, email, full_name) "
+    "VALUES ('delete', old.id, old.username, old.email, old.full_name); END",
+    "CREATE TRIGGER IF NOT EXISTS user_search_update AFTER UPDATE OF username, email, full_name ON user BEGIN "
+    "INSERT INTO user_search (user_search, rowid, username, email, full_name) "
+    "VALUES ('delete', old.id, old.username, old.email, old.full_name); "
+    "INSERT INTO user_search (rowid, username, email, full_name) "
+    "VALUES (new.id, new.username, new.email, new.full_name); END",
+)
+
+TOKEN = re.compile(r'\w+')
+
+# The FTS5 tables above and their shadow tables (lot_search_data and so
+# on). They are created by hand, so migrations/env.py keeps autogenerate
+# away from them.
+FTS_TABLE_PREFIXES = ('lot_search', 'user_search')
+
+# db.create_all() builds the indexes alongside the regular tables.
+for statement in (CREATE_INDEX_SQL, CREATE_USER_INDEX_SQL, *USER_INDEX_TRIGGERS_SQL):
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def index_lot(lot_id):
+    """(Re)index one lot. The lot must already be flushed."""
+    remove_lot(lot_id)
+    db.session.execute(text(INDEX_ROWS_SQL + " WHERE parking_lot.id = :lot_id"), {'lot_id': lot_id})
+
+
+def remove_lot(lot_id):
+    db.session.execute(text("DELETE FROM lot_search WHERE rowid = :lot_id"), {'lot_id': lot_id})
+
+
+def rebuild_index():
+    db.session.execute(text("DELETE FROM lot_search"))
+    return db.session.execute(text(INDEX_ROWS_SQL)).rowcount
+
+
+def rebuild_user_index():
+    db.session.execute(text("INSERT INTO user_search (user_search) VALUES ('rebuild')"))
+    return db.session.execute(text("SELECT count(*) FROM user")).scalar()
+
+
+def matching_user_ids(term):
+    """A select of the ids of users with a word starting with each word of
+    `term`, for use in IN (...). None if `term` has no words."""
+    expression = match_expression(term)
+    if not expression:
+        return None
+    return (
+        text("SELECT rowid FROM user_search WHERE user_search MATCH :expression")
+        .bindparams(expression=expression)
+        .columns(rowid=db.Integer)
+    )
+
+
+def match_expression(term):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    tokens = TOKEN.findall(term.lower())
+    return ' '.join(f'"{token}"*' for token in tokens) or None
+
+
+def search(term, limit=None):
+    """Ranked matches as rows of (id, name, address, pin_code, city, state)."""
+    expression = match_expression(term)
+    if not expression:
+        return []
+    sql = (
+        "SELECT rowid AS id, name, address, pin_code, city, state FROM lot_search "
+        f"WHERE lot_search MATCH :expression ORDER BY {RANK_SQL}"
+    )
+    params = {'expression': expression}
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params['limit'] = limit
+    return db.session.execute(text(sql), params).all()
+
+
+def filter_lots(search_term='', state='', city=''):
+    """The lot list behind both dashboards.
+
+    Free-text search goes through the FTS index and keeps its ranking. The
+    state and city filters are resolved to city ids from the reference
+    cache, so the lot query only ever does index lookups.
+    """
+    query = ParkingLot.query.options(db.joinedload(ParkingLot.city))
+
+    if state or city:
+        city_ids = [
+            c.id for c in reference_cache.cities()
+            if state in c.state.lower() and city in c.name.lower()
+        ]
+        query = query.filter(ParkingLot.city_id.in_(city_ids))
+
+    if not search_term:
+        return query.all()
+
+    ranked_ids = [row.id for row in search(search_term)]
+    if not ranked_ids:
+        return []
+    rank = {lot_id: position for position, lot_id in enumerate(ranked_ids)}
+    lots = query.filter(ParkingLot.id.in_(ranked_ids)).all()
+    return sorted(lots, key=lambda lot: rank[lot.id])
@@ -1,6 +1,14 @@
-from app import app, db, bcrypt
-from models import Admin, City, User, ParkingLot, ParkingSpot
-from datetime import datetime
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from extensions import bcrypt
+from models import db, Admin, City, User, ParkingLot, ParkingSpot, Reservation, LotDailyStats, UserStats
+from pricing import parking_costs
+from provisioning import provision_spots
+import search as lot_search
 
 def seed_admin():
     if not Admin.query.filter_by(username='admin').first():
@@ -102,13 +110,13 @@ def seed_parking_lots_and_spots():
                     address=lot_data['address'],
                     pin_code=lot_data['pin_code'],
                     price_per_hour=lot_data['price_per_hour'],
-                    max_spots=lot_data['max_spots']
+                    max_spots=lot_data['max_spots'],
+                    available=lot_data['max_spots']
                 )
                 db.session.add(lot)
                 db.session.flush()
-                for _ in range(lot.max_spots):
-                    spot = ParkingSpot(lot_id=lot.id)
-                    db.session.add(spot)
+                provision_spots(lot.id, lot.max_spots)
+                lot_search.index_lot(lot.id)
                 print(f"✅ Created lot and spots for {lot.prime_location_name}, Bengaluru.")
             else:
                 print(f"ℹ️ Lot already exists for {lot_data['prime_location_name']}, Bengaluru.")
@@ -118,10 +126,183 @@ def seed_parking_lots_and_spots():
         print("❌ Bengaluru city not found. Please seed cities first.")
 
 
+# Presets for generate_dataset(), from a quick local run to years of history.
+DATASET_SIZES = {
+    'small': dict(cities=10, lots_per_city=5, spots_per_lot=50, users=500, reservations=20000),
+    'medium': dict(cities=30, lots_per_city=10, spots_per_lot=200, users=5000, reservations=300000),
+    'large': dict(cities=100, lots_per_city=20, spots_per_lot=500, users=50000, reservations=3000000),
+}
+
+# Every generated user logs in with this password.
+GENERATED_PASSWORD = 'password123'
+
+# Rows per bulk insert round trip.
+INSERT_CHUNK_SIZE = 50000
+
+STATES = [
+    ('Uttar Pradesh', 'UP'), ('Delhi', 'DL'), ('Maharashtra', 'MH'), ('Tamil Nadu', 'TN'),
+    ('Karnataka', 'KA'), ('Telangana', 'TS'), ('West Bengal', 'WB'), ('Rajasthan', 'RJ'),
+    ('Gujarat', 'GJ'), ('Kerala', 'KL'), ('Punjab', 'PB'), ('Madhya Pradesh', 'MP')
+]
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Rohan', 'Sanya', 'Arjun', 'Priya']
+LAST_NAMES = ['Sharma', 'Verma', 'Iyer', 'Reddy', 'Patel', 'Gupta', 'Nair', 'Singh', 'Das', 'Khan', 'Mehta', 'Rao']
+LOCATIONS = ['Station Road', 'Market', 'Mall', 'Bus Stand', 'Tech Park', 'Hospital', 'Stadium', 'Airport Road', 'Old Town', 'Lake View']
+
+
+def bulk_insert(model, rows):
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.session.execute(model.__table__.insert(), rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def generate_dataset(cities, lots_per_city, spots_per_lot, users, reservations,
+                     active_ratio=0.02, history_days=730, seed=42):
+    """Bulk-load a synthetic dataset into an empty database.
+
+    Builds `cities` cities, `lots_per_city` lots per city of about
+    `spots_per_lot` spots each, `users` users and `reservations`
+    reservations spread over `history_days`. A share of `active_ratio`
+    of the reservations (capped by the number of spots) are still active
+    and occupy their spot. Reservations are skewed towards low user ids so
+    there are some very frequent parkers. Counters and the search index
+    are rebuilt at the end.
+    """
+    if db.session.query(ParkingLot.id).first() or db.session.query(User.id).first():
+        raise ValueError("generate_dataset() needs an empty database.")
+
+    rng = np.random.default_rng(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+
+    city_rows = []
+    for city_id in range(1, cities + 1):
+        state, _ = STATES[(city_id - 1) % len(STATES)]
+        city_rows.append({'id': city_id, 'name': f"City {city_id:03d}", 'state': state})
+    bulk_insert(City, city_rows)
+
+    lot_count = cities * lots_per_city
+    lot_city_ids = np.repeat(np.arange(1, cities + 1), lots_per_city)
+    lot_sizes = rng.integers(max(1, spots_per_lot // 2), spots_per_lot * 3 // 2 + 1, lot_count)
+    lot_prices = rng.integers(2, 13, lot_count) * 5.0
+    bulk_insert(ParkingLot, [
+        {
+            'id': lot_id,
+            'city_id': int(lot_city_ids[lot_id - 1]),
+            'prime_location_name': f"{LOCATIONS[lot_id % len(LOCATIONS)]} {lot_id}",
+            'address': f"{lot_id} {LOCATIONS[(lot_id * 7) % len(LOCATIONS)]}",
+            'pin_code': f"{100000 + int(lot_city_ids[lot_id - 1]) * 1000 + lot_id % 1000}",
+            'price_per_hour': float(lot_prices[lot_id - 1]),
+            'max_spots': int(lot_sizes[lot_id - 1]),
+            'created_at': now - timedelta(days=history_days)
+        }
+        for lot_id in range(1, lot_count + 1)
+    ])
+
+    # Spot ids are assigned explicitly so each spot's lot and price can be
+    # looked up by position when generating reservations.
+    spot_count = int(lot_sizes.sum())
+    spot_lot_ids = np.repeat(np.arange(1, lot_count + 1), lot_sizes)
+    spot_prices = lot_prices[spot_lot_ids - 1]
+    active_count = min(int(reservations * active_ratio), spot_count * 8 // 10)
+    active_spots = rng.choice(spot_count, active_count, replace=False)
+    spot_status = np.full(spot_count, 'A')
+    spot_status[active_spots] = 'O'
+    bulk_insert(ParkingSpot, [
+        {'id': i + 1, 'lot_id': int(spot_lot_ids[i]), 'status': str(spot_status[i]),
+         'created_at': now - timedelta(days=history_days)}
+        for i in range(spot_count)
+    ])
+
+    password_hash = bcrypt.generate_password_hash(GENERATED_PASSWORD).decode('utf-8')
+    user_rows = []
+    for user_id in range(1, users + 1):
+        first = FIRST_NAMES[user_id % len(FIRST_NAMES)]
+        last = LAST_NAMES[(user_id // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        user_rows.append({
+            'id': user_id,
+            'username': f"user{user_id:06d}",
+            'full_name': f"{first} {last}",
+            'email': f"user{user_id:06d}@example.com",
+            'password_hash': password_hash,
+            'address': f"{user_id} {LOCATIONS[user_id % len(LOCATIONS)]}",
+            'pin_code': f"{110000 + user_id % 900000}",
+            'role': 'user',
+            'created_at': now - timedelta(days=history_days)
+        })
+    bulk_insert(User, user_rows)
+
+    def user_ids(size):
+        return (np.floor(users * rng.random(size) ** 3) + 1).astype(np.int64)
+
+    def vehicles(ids):
+        return [f"{STATES[uid % len(STATES)][1]}{uid % 90 + 10:02d}AB{uid % 10000:04d}" for uid in ids.tolist()]
+
+    # Active reservations, one per occupied spot.
+    active_users = user_ids(active_count)
+    parked = np.datetime64(now, 's') - rng.integers(60, 12 * 3600, active_count).astype('timedelta64[s]')
+    bulk_insert(Reservation, [
+        {'spot_id': int(spot) + 1, 'user_id': int(uid), 'vehicle_number': vehicle,
+         'parking_timestamp': parked_at, 'leaving_timestamp': None,
+         'parking_cost': None, 'is_active': True}
+        for spot, uid, vehicle, parked_at in zip(
+            active_spots, active_users, vehicles(active_users), parked.astype(datetime).tolist())
+    ])
+
+    # Completed history, generated and inserted one chunk at a time.
+    remaining = reservations - active_count
+    while remaining > 0:
+        size = min(remaining, INSERT_CHUNK_SIZE)
+        spots = rng.integers(0, spot_count, size)
+        chunk_users = user_ids(size)
+        parked = np.datetime64(now, 's') - rng.integers(3600, history_days * 86400, size).astype('timedelta64[s]')
+        minutes = np.clip(rng.lognormal(np.log(90), 0.9, size), 1, 1440).astype(np.int64)
+        left = parked + (minutes * 60 + rng.integers(0, 60, size)).astype('timedelta64[s]')
+        costs = parking_costs(spot_prices[spots], minutes)
+        bulk_insert(Reservation, [
+            {'spot_id': int(spot) + 1, 'user_id': int(uid), 'vehicle_number': vehicle,
+             'parking_timestamp': parked_at, 'leaving_timestamp': left_at,
+             'parking_cost': float(cost), 'is_active': False}
+            for spot, uid, vehicle, parked_at, left_at, cost in zip(
+                spots, chunk_users, vehicles(chunk_users), parked.astype(datetime).tolist(),
+                left.astype(datetime).tolist(), costs)
+        ])
+        remaining -= size
+
+    ParkingLot.reconcile_counters()
+    LotDailyStats.backfill()
+    UserStats.backfill()
+    lot_search.rebuild_index()
+    db.session.commit()
+    return {'cities': cities, 'lots': lot_count, 'spots': spot_count, 'users': users,
+            'reservations': reservations, 'active': active_count}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed the database.")
+    parser.add_argument('--size', choices=sorted(DATASET_SIZES),
+                        help="generate a synthetic dataset of this size instead of the demo data")
+    for option in ('cities', 'lots-per-city', 'spots-per-lot', 'users', 'reservations'):
+        parser.add_argument(f'--{option}', type=int, help="override the preset's value")
+    parser.add_argument('--seed', type=int, default=42, help="random seed for the generator")
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    with app.app_context():
+    from app import create_app
+
+    args = parse_args()
+    with create_app().app_context():
         seed_admin()
-        seed_cities()
-        seed_users()
-        seed_parking_lots_and_spots()
-        db.session.commit()
+        if args.size:
+            params = dict(DATASET_SIZES[args.size])
+            for key in params:
+                if getattr(args, key) is not None:
+                    params[key] = getattr(args, key)
+            started = time.perf_counter()
+            counts = generate_dataset(seed=args.seed, **params)
+            db.session.commit()
+            print(f"✅ Generated {counts} in {time.perf_counter() - started:.1f}s "
+                  f"(user password: {GENERATED_PASSWORD})")
+        else:
+            seed_cities()
+            seed_users()
+            seed_parking_lots_and_spots()
+            db.session.commit()